@@ -0,0 +1,24 @@
+from tortoise import connections
+
+"""
+Частичные индексы таблиц, которые не описываются в моделях TortoiseORM
+"""
+
+# Частичные индексы товаров для отбора товаров в наличии и участвующих в акции (совпадают с миграцией 3)
+PARTIAL_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS "idx_products_in_stock_price" ON "products" ("price") WHERE "is_active" = 1 AND "count" > 0;
+CREATE INDEX IF NOT EXISTS "idx_products_action_price" ON "products" ("price") WHERE "action" = 1;
+"""
+
+
+async def init_partial_indexes() -> bool:
+    """
+    Создание частичных индексов товаров. Схема, созданная generate_schemas, содержит только индексы моделей,
+    поэтому частичные индексы создаются при запуске приложения, если их ещё нет.
+    :return: True - индексы созданы или уже существуют, False - база данных не SQLite.
+    """
+    conn = connections.get('default')
+    if conn.capabilities.dialect != 'sqlite':
+        return False
+    await conn.execute_script(PARTIAL_INDEX_SQL)
+    return True
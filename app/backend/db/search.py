@@ -0,0 +1,135 @@
+import sqlite3
+
+from tortoise import Tortoise, connections, run_async
+from tortoise.exceptions import OperationalError
+
+from .db import tortoise_orm
+
+"""
+Полнотекстовый поиск товаров (SQLite FTS5)
+"""
+
+# Признак доступности полнотекстового индекса: None - не проверялся.
+_available: bool | None = None
+
+CREATE_INDEX_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS "products_fts" USING fts5(
+    "name", "description", "item_number", content='products', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS "products_fts_insert" AFTER INSERT ON "products" BEGIN
+    INSERT INTO "products_fts"(rowid, "name", "description", "item_number")
+    VALUES (new."id", new."name", new."description", new."item_number");
+END;
+CREATE TRIGGER IF NOT EXISTS "products_fts_delete" AFTER DELETE ON "products" BEGIN
+    INSERT INTO "products_fts"("products_fts", rowid, "name", "description", "item_number")
+    VALUES ('delete', old."id", old."name", old."description", old."item_number");
+END;
+CREATE TRIGGER IF NOT EXISTS "products_fts_update" AFTER UPDATE OF "name", "description", "item_number"
+ON "products" BEGIN
+    INSERT INTO "products_fts"("products_fts", rowid, "name", "description", "item_number")
+    VALUES ('delete', old."id", old."name", old."description", old."item_number");
+    INSERT INTO "products_fts"(rowid, "name", "description", "item_number")
+    VALUES (new."id", new."name", new."description", new."item_number");
+END;
+"""
+
+
+async def init_search_index() -> bool:
+    """
+    Создание полнотекстового индекса товаров и триггеров, поддерживающих его в актуальном состоянии при записи в
+    таблицу товаров. При первом создании индекс заполняется имеющимися данными.
+    :return: True - индекс доступен, False - FTS5 не поддерживается базой данных.
+    """
+    global _available
+    conn = connections.get('default')
+    if conn.capabilities.dialect != 'sqlite':
+        _available = False
+        return _available
+    exists = await conn.execute_query_dict(
+        "SELECT \"name\" FROM \"sqlite_master\" WHERE \"type\"='table' AND \"name\"='products_fts'")
+    try:
+        await conn.execute_script(CREATE_INDEX_SQL)
+    except (OperationalError, sqlite3.OperationalError):
+        _available = False
+        return _available
+    _available = True
+    if not exists:
+        await rebuild_search_index()
+    return _available
+
+
+async def rebuild_search_index():
+    """
+    Перестроение полнотекстового индекса по текущему содержимому таблицы товаров.
+    """
+    conn = connections.get('default')
+    await conn.execute_script("INSERT INTO \"products_fts\"(\"products_fts\") VALUES ('rebuild');")
+
+
+def search_available() -> bool:
+    """
+    Проверка доступности полнотекстового индекса.
+    :return: True - индекс создан и может использоваться, False - необходимо использовать поиск по вхождению строки.
+    """
+    return bool(_available)
+
+
+def make_match_query(q: str) -> str:
+    """
+    Преобразование строки поиска в запрос FTS5. Каждое слово экранируется и ищется по префиксу, слова объединяются
+    условием И.
+    :param q: Строка поиска.
+    :return: Выражение для оператора MATCH или пустая строка.
+    """
+    terms = ['"' + term.replace('"', '""') + '"*' for term in q.split()]
+    return ' '.join(terms)
+
+
+async def count_products(q: str) -> int:
+    """
+    Подсчёт количества товаров, соответствующих строке поиска.
+    :param q: Строка поиска.
+    :return: Количество найденных товаров.
+    """
+    match = make_match_query(q)
+    if not match:
+        return 0
+    conn = connections.get('default')
+    rows = await conn.execute_query_dict(
+        "SELECT COUNT(*) AS \"total\" FROM \"products_fts\" WHERE \"products_fts\" MATCH ?", [match])
+    return rows[0]['total']
+
+
+async def search_products(q: str, limit: int, offset: int = 0) -> list[int]:
+    """
+    Поиск товаров по названию, описанию и артикулу с ранжированием результатов (bm25).
+    :param q: Строка поиска.
+    :param limit: Количество идентификаторов в результате.
+    :param offset: Количество пропускаемых результатов.
+    :return: Список идентификаторов товаров в порядке релевантности.
+    """
+    match = make_match_query(q)
+    if not match:
+        return []
+    conn = connections.get('default')
+    rows = await conn.execute_query_dict(
+        "SELECT rowid AS \"id\" FROM \"products_fts\" WHERE \"products_fts\" MATCH ? "
+        "ORDER BY bm25(\"products_fts\") LIMIT ? OFFSET ?", [match, limit, offset])
+    return [row['id'] for row in rows]
+
+
+async def main():
+    """
+    Перестроение полнотекстового индекса товаров для существующих данных.
+    Запуск: python -m app.backend.db.search
+    """
+    await Tortoise.init(config=tortoise_orm)
+    if await init_search_index():
+        await rebuild_search_index()
+        print('Индекс поиска товаров перестроен')
+    else:
+        print('FTS5 не поддерживается базой данных, используется поиск по вхождению строки')
+
+
+if __name__ == '__main__':
+    run_async(main())
@@ -0,0 +1,86 @@
+import os
+import time
+
+"""
+Кэш справочных данных в памяти процесса
+"""
+
+# Срок хранения справочных данных в кэше, секунд
+REFERENCE_CACHE_TTL = float(os.getenv('REFERENCE_CACHE_TTL', '60'))
+
+# Зарегистрированные кэши: имя - кэш
+caches = {}
+
+
+class ReferenceCache:
+    """
+    Класс - кэш справочных данных с ограниченным сроком хранения. Данные сбрасываются обработчиками, изменяющими
+    справочник, срок хранения ограничивает устаревание данных, изменённых другим процессом.
+    """
+
+    def __init__(self, name: str, ttl: float = REFERENCE_CACHE_TTL):
+        """
+        Инициализация кэша.
+        :param name: Название кэша.
+        :param ttl: Срок хранения данных, секунд.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._generation = 0
+        caches[name] = self
+
+    async def get(self, key, loader):
+        """
+        Получение данных из кэша. При отсутствии данных или истечении срока хранения данные загружаются.
+        :param key: Ключ данных.
+        :param loader: Асинхронная функция загрузки данных.
+        :return: Данные.
+        """
+        entry = self._data.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generation
+        value = await loader()
+        # данные, изменённые во время загрузки, в кэш не записываются
+        if generation == self._generation:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def update(self, key, func):
+        """
+        Изменение данных в кэше без повторной загрузки. Если данных в кэше нет, они будут загружены при
+        следующем запросе.
+        :param key: Ключ данных.
+        :param func: Функция, изменяющая данные.
+        """
+        self._generation += 1
+        entry = self._data.get(key)
+        if entry is not None:
+            func(entry[1])
+
+    def invalidate(self):
+        """
+        Сброс всех данных кэша.
+        """
+        self._generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Получение статистики использования кэша.
+        :return: Количество попаданий, промахов и записей в кэше.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+def cache_stats() -> dict:
+    """
+    Получение статистики использования всех кэшей.
+    :return: Статистика по каждому кэшу.
+    """
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,88 @@
+import csv
+import io
+import os
+from typing import AsyncIterator, Callable
+
+import orjson
+from tortoise.queryset import QuerySet
+
+"""
+Выгрузка таблиц в файлы CSV или JSONL частями по первичному ключу
+"""
+
+# Количество записей, выбираемых из базы данных одним запросом
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+# Форматы выгрузки: формат - (тип содержимого, расширение файла)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def export_format(file_format: str) -> str:
+    """
+    Проверка формата выгрузки.
+    :param file_format: Запрошенный формат.
+    :return: Формат выгрузки: csv или jsonl, по умолчанию csv.
+    """
+    return file_format if file_format in EXPORT_FORMATS else 'csv'
+
+
+def export_headers(name: str, file_format: str) -> dict:
+    """
+    Заголовки ответа с файлом выгрузки.
+    :param name: Имя файла без расширения.
+    :param file_format: Формат выгрузки.
+    :return: Заголовки ответа.
+    """
+    return {'content-disposition': f'attachment; filename="{name}.{EXPORT_FORMATS[file_format][1]}"'}
+
+
+async def iter_chunks(queryset: QuerySet, fields: tuple[str, ...],
+                      chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[list[dict]]:
+    """
+    Выборка записей запроса частями фиксированного размера. Каждая часть выбирается по ключу (id больше
+    последнего выбранного), поэтому расход памяти и стоимость запроса не зависят от размера таблицы.
+    :param queryset: Запрос.
+    :param fields: Выбираемые поля, первым должен быть id.
+    :param chunk_size: Количество записей в части.
+    :return: Части результата запроса.
+    """
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        rows = await chunk.order_by('id').limit(chunk_size).values(*fields)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+
+async def export_rows(queryset: QuerySet, fields: tuple[str, ...], columns: tuple[str, ...], file_format: str,
+                      convert: Callable[[dict], dict] | None = None) -> AsyncIterator[bytes]:
+    """
+    Выгрузка результата запроса в формате CSV или JSONL. Файл формируется по частям по мере выборки записей.
+    :param queryset: Запрос.
+    :param fields: Выбираемые поля, первым должен быть id.
+    :param columns: Колонки файла.
+    :param file_format: Формат выгрузки: csv или jsonl.
+    :param convert: Функция преобразования выбранной записи в строку файла.
+    :return: Части файла.
+    """
+    if file_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        yield buffer.getvalue().encode('utf-8')
+    async for rows in iter_chunks(queryset, fields):
+        if convert is not None:
+            rows = [convert(row) for row in rows]
+        if file_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+        else:
+            yield b''.join(orjson.dumps({column: row.get(column) for column in columns}) + b'\n' for row in rows)
@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from PIL import Image, UnidentifiedImageError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise import Tortoise, run_async
+
+from app.backend.db.db import tortoise_orm
+from app.models.product import ProductModel
+from app.shemas import Product
+
+"""
+Обработка изображений товаров вне цикла событий
+"""
+
+# Каталог изображений товаров
+IMAGE_DIR = './app/templates/product/image/'
+# Размер хэша содержимого изображения, байт
+DIGEST_SIZE = 20
+# Размер блока чтения загружаемого файла, байт
+CHUNK_SIZE = 64 * 1024
+# Максимальный размер загружаемого изображения, байт
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(10 * 1024 * 1024)))
+# Запас на остальные поля формы и заголовки частей запроса загрузки изображения, байт
+FORM_OVERHEAD = 64 * 1024
+# Пути запросов загрузки изображений товаров
+UPLOAD_PATHS = re.compile(r'/product/(create|update_image_product/[^/]+)')
+# Размер миниатюры для списка товаров
+THUMBNAIL_SIZE = (100, 100)
+# Варианты изображения товара: ключ - максимальный размер
+VARIANTS = {
+    'list': THUMBNAIL_SIZE,  # карточка в списке товаров
+    'page': (600, 600),  # страница товара
+    'zoom': (1600, 1600),  # увеличенное изображение
+    'lqip': (16, 16),  # заполнитель на время загрузки изображения
+}
+# Форматы вариантов изображения: формат - (расширение файла, параметры сохранения)
+VARIANT_FORMATS = {
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# Количество потоков для записи и обработки изображений
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='images')
+
+
+async def run_in_pool(func, *args):
+    """
+    Выполнение функции в пуле потоков обработки изображений.
+    :param func: Функция.
+    :param args: Аргументы функции.
+    :return: Результат выполнения функции.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+def variant_path(file_path: str, key: str, image_format: str) -> str:
+    """
+    Получение пути к файлу варианта изображения. Варианты хранятся в каталоге изображений товара рядом с
+    исходным файлом.
+    :param file_path: Путь к исходному изображению.
+    :param key: Ключ варианта изображения.
+    :param image_format: Формат варианта изображения: webp или jpeg.
+    :return: Путь к файлу варианта.
+    """
+    directory, file_name = os.path.split(file_path)
+    return os.path.join(directory, f'{key}_{file_name}.{VARIANT_FORMATS[image_format][0]}')
+
+
+def make_variant(file_path: str, result_path: str, size: tuple[int, int], image_format: str):
+    """
+    Создание варианта изображения заданного размера. Для JPEG используется декодирование в уменьшенном
+    масштабе (draft), поэтому большое изображение не декодируется полностью. Файл записывается во временный файл и
+    переименовывается, поэтому параллельные запросы не получают частично записанный вариант.
+    :param file_path: Путь к исходному изображению.
+    :param result_path: Путь к файлу варианта.
+    :param size: Максимальный размер варианта.
+    :param image_format: Формат варианта изображения: webp или jpeg.
+    """
+    with Image.open(file_path) as image:
+        image.draft('RGB', size)
+        image.thumbnail(size=size)
+        if image_format == 'jpeg' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        temp_path = f'{result_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        image.save(temp_path, image_format.upper(), **VARIANT_FORMATS[image_format][1])
+    os.replace(temp_path, result_path)
+
+
+async def get_variant(file_path: str, key: str, image_format: str) -> str:
+    """
+    Получение варианта изображения. Вариант создаётся при первом запросе и сохраняется на диске, повторно
+    создаётся только после замены исходного изображения.
+    :param file_path: Путь к исходному изображению.
+    :param key: Ключ варианта изображения.
+    :param image_format: Формат варианта изображения: webp или jpeg.
+    :return: Путь к файлу варианта.
+    """
+    result_path = variant_path(file_path, key, image_format)
+    try:
+        if os.stat(result_path).st_mtime >= os.stat(file_path).st_mtime:
+            return result_path
+    except FileNotFoundError:
+        pass
+    await run_in_pool(make_variant, file_path, result_path, VARIANTS[key], image_format)
+    return result_path
+
+
+def is_digest(img: str) -> bool:
+    """
+    Проверка, является ли имя изображения товара хэшем содержимого.
+    :param img: Значение поля img товара.
+    :return: True - изображение хранится по хэшу содержимого, False - по имени товара и имени файла.
+    """
+    return re.fullmatch(f'[0-9a-f]{{{DIGEST_SIZE * 2}}}', img) is not None
+
+
+def content_path(digest: str) -> str:
+    """
+    Получение пути к файлу изображения по хэшу содержимого. Файлы распределяются по подкаталогам по первым
+    символам хэша.
+    :param digest: Хэш содержимого изображения.
+    :return: Путь к файлу изображения.
+    """
+    return os.path.join(IMAGE_DIR, digest[:2], digest[2:4], digest)
+
+
+def image_path(product: Product | ProductModel) -> str:
+    """
+    Получение пути к файлу исходного изображения товара.
+    :param product: Модель продукта, для которого определяется путь к изображению.
+    :return: Путь к файлу изображения.
+    """
+    if is_digest(product.img):
+        return content_path(product.img)
+    return os.path.join(IMAGE_DIR, product.name, product.img)
+
+
+def open_temp_file() -> tuple[BinaryIO, str]:
+    """
+    Создание временного файла для записи загружаемого изображения в каталоге хранилища.
+    :return: Открытый для записи файл и путь к нему.
+    """
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', prefix='upload.', dir=IMAGE_DIR)
+    return os.fdopen(fd, 'wb'), temp_path
+
+
+def store_image(source: BinaryIO, max_size: int | None = None) -> str:
+    """
+    Запись изображения в хранилище по хэшу содержимого (BLAKE2). Файл хэшируется и проверяется на месте, в
+    хранилище он копируется один раз и только если такого изображения ещё нет, поэтому одинаковые изображения
+    хранятся в одном экземпляре. Варианты изображения создаются при первом запросе. Файл, не являющийся
+    изображением, отклоняется с ошибкой 415, изображение слишком большого разрешения - с ошибкой 400.
+    :param source: Файл изображения, открытый в двоичном режиме с возможностью перемещения по файлу.
+    :param max_size: Максимальный размер файла, байт, None - без ограничения.
+    :return: Хэш содержимого изображения.
+    """
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    size = 0
+    source.seek(0)
+    while chunk := source.read(CHUNK_SIZE):
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail='Файл слишком большой')
+        hasher.update(chunk)
+    digest = hasher.hexdigest()
+    file_path = content_path(digest)
+    if os.path.exists(file_path):
+        return digest
+    source.seek(0)
+    try:
+        with Image.open(source) as image:
+            image.verify()
+    except Image.DecompressionBombError:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail='Слишком большое разрешение изображения')
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise HTTPException(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail='Файл не является изображением')
+    source.seek(0)
+    f, temp_path = open_temp_file()
+    try:
+        with f:
+            shutil.copyfileobj(source, f, CHUNK_SIZE)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return digest
+
+
+async def store_upload(file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> str:
+    """
+    Запись загружаемого изображения в хранилище по хэшу содержимого. Размер запроса ограничивается при приёме
+    (UploadLimitMiddleware), принятый файл записывается в хранилище без промежуточной копии.
+    :param file: Загружаемый файл.
+    :param max_size: Максимальный размер файла, байт.
+    :return: Хэш содержимого изображения.
+    """
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail='Файл слишком большой')
+    return await run_in_pool(store_image, file.file, max_size)
+
+
+class UploadLimitMiddleware:
+    """
+    Ограничение размера запроса загрузки изображения при приёме. Запрос, у которого заголовок Content-Length больше
+    допустимого размера, отклоняется до чтения тела. При передаче тела частями приём прерывается, как только размер
+    тела превышает допустимый.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int = MAX_UPLOAD_SIZE + FORM_OVERHEAD):
+        """
+        Инициализация middleware.
+        :param app: Приложение ASGI.
+        :param max_size: Максимальный размер тела запроса, байт.
+        """
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or UPLOAD_PATHS.fullmatch(scope['path']) is None:
+            await self.app(scope, receive, send)
+            return
+        length = Headers(scope=scope).get('content-length', '')
+        if length.isdigit() and int(length) > self.max_size:
+            response = JSONResponse({'detail': 'Файл слишком большой'}, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_size:
+                    raise HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail='Файл слишком большой')
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+
+async def warm_variants() -> tuple[int, int]:
+    """
+    Создание всех вариантов изображений для всех товаров каталога.
+    :return: Количество созданных вариантов и количество товаров с отсутствующим или повреждённым изображением.
+    """
+    created, failed = 0, 0
+    async for product in ProductModel.all().only('id', 'name', 'img'):
+        tasks = [get_variant(image_path(product), key, image_format)
+                 for key in VARIANTS for image_format in VARIANT_FORMATS]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if any(isinstance(result, Exception) for result in results):
+            failed += 1
+        created += sum(1 for result in results if not isinstance(result, Exception))
+    return created, failed
+
+
+async def migrate_images() -> tuple[int, int]:
+    """
+    Перенос изображений товаров, хранящихся по имени товара и имени файла, в хранилище по хэшу содержимого.
+    :return: Количество перенесённых изображений и количество товаров с отсутствующим или повреждённым изображением.
+    """
+    moved, failed = 0, 0
+    async for product in ProductModel.all().only('id', 'name', 'img'):
+        if is_digest(product.img):
+            continue
+        try:
+            with open(image_path(product), 'rb') as source:
+                digest = await run_in_pool(store_image, source)
+        except Exception:
+            failed += 1
+            continue
+        await ProductModel.filter(id=product.id).update(img=digest)
+        moved += 1
+    return moved, failed
+
+
+async def main(command: str):
+    """
+    Обслуживание изображений каталога.
+    Запуск: python -m app.backend.service.images [warm|migrate]
+    warm - предварительное создание вариантов изображений для всего каталога,
+    migrate - перенос изображений в хранилище по хэшу содержимого.
+    :param command: Команда.
+    """
+    await Tortoise.init(config=tortoise_orm)
+    if command == 'migrate':
+        moved, failed = await migrate_images()
+        print(f'Перенесено изображений: {moved}, товаров с ошибкой: {failed}')
+    else:
+        created, failed = await warm_variants()
+        print(f'Вариантов изображений: {created}, товаров с ошибкой: {failed}')
+
+
+if __name__ == '__main__':
+    run_async(main(sys.argv[1] if len(sys.argv) > 1 else 'warm'))
@@ -0,0 +1,273 @@
+import csv
+import io
+import json
+import os
+import sys
+from typing import BinaryIO, Iterator
+
+from tortoise import Tortoise, run_async
+from tortoise.transactions import in_transaction
+
+from app.backend.db.db import tortoise_orm
+from app.backend.service.images import is_digest
+from app.depends.category import get_category_tree
+from app.depends.product import invalidate_category_counts
+from app.models.product import ProductModel
+
+"""
+Загрузка товаров из файла CSV или JSONL
+"""
+
+# Количество строк файла, записываемых в базу данных одной транзакцией
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+# Максимальное количество ошибок в отчёте о загрузке
+MAX_IMPORT_ERRORS = 100
+# Поля товара, загружаемые из файла
+IMPORT_FIELDS = ('name', 'description', 'price', 'count', 'category', 'is_active', 'action', 'img')
+# Поля, обязательные для нового товара
+REQUIRED_FIELDS = ('name', 'price', 'count', 'category_id')
+# Значения, обозначающие истину в логических полях
+TRUE_VALUES = ('1', 'true', 'yes', 'да', 'on')
+
+
+class ImportReport:
+    """
+    Класс - отчёт о загрузке товаров
+    """
+
+    def __init__(self):
+        """
+        Инициализация отчёта.
+        """
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line: int, message: str):
+        """
+        Добавление ошибки загрузки строки файла.
+        :param line: Номер строки файла.
+        :param message: Описание ошибки.
+        """
+        self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return f'Добавлено товаров: {self.created}, обновлено: {self.updated}, строк с ошибкой: {self.failed}'
+
+
+def read_rows(source: BinaryIO, file_format: str) -> Iterator[tuple[int, dict | None, str]]:
+    """
+    Последовательное чтение строк файла без загрузки всего файла в память.
+    :param source: Файл, открытый в двоичном режиме.
+    :param file_format: Формат файла: csv или jsonl.
+    :return: Номер строки, данные строки (None при ошибке разбора) и описание ошибки разбора.
+    """
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'jsonl':
+            for line, row in enumerate(text, start=1):
+                if not row.strip():
+                    continue
+                try:
+                    data = json.loads(row)
+                except ValueError as error:
+                    yield line, None, f'Ошибка разбора JSON: {error}'
+                    continue
+                if isinstance(data, dict):
+                    yield line, data, ''
+                else:
+                    yield line, None, 'Строка должна содержать объект JSON'
+        else:
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row, ''
+    finally:
+        text.detach()
+
+
+def file_format_by_name(file_name: str) -> str:
+    """
+    Определение формата файла по расширению имени файла.
+    :param file_name: Имя файла.
+    :return: Формат файла: csv или jsonl.
+    """
+    return 'jsonl' if os.path.splitext(file_name or '')[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+async def load_category_map() -> dict[str, int]:
+    """
+    Получение соответствия названий категорий их идентификаторам по дереву категорий из кэша. Категория может
+    быть указана идентификатором, полным названием ("Родитель / Категория") или названием, если оно уникально.
+    :return: Словарь: название категории в нижнем регистре - идентификатор категории.
+    """
+    tree = await get_category_tree()
+    names = {}
+    for category in tree.categories:
+        names.setdefault(category.name.strip().lower(), []).append(category.id)
+    result = {name: ids[0] for name, ids in names.items() if len(ids) == 1}
+    for category in tree.categories:
+        result[tree.path(category.id).strip().lower()] = category.id
+        result[str(category.id)] = category.id
+    return result
+
+
+def parse_row(row: dict, categories: dict[str, int]) -> dict:
+    """
+    Проверка и преобразование данных строки файла в значения полей товара.
+    :param row: Данные строки файла.
+    :param categories: Соответствие названий категорий их идентификаторам.
+    :return: Значения полей товара, указанные в строке.
+    """
+    data = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        if value is None or (isinstance(value, str) and value.strip() == ''):
+            continue
+        if field in ('price', 'count'):
+            try:
+                data[field] = float(value) if field == 'price' else int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'Неверное значение поля {field}: {value}')
+        elif field == 'category':
+            category = categories.get(str(value).strip().lower())
+            if category is None:
+                raise ValueError(f'Категория {value} не найдена')
+            data['category_id'] = category
+        elif field == 'img':
+            if not is_digest(str(value).strip()):
+                raise ValueError(f'Изображение должно быть указано хэшем содержимого: {value}')
+            data[field] = str(value).strip()
+        elif field in ('is_active', 'action'):
+            data[field] = value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+        else:
+            data[field] = str(value)
+    return data
+
+
+async def write_batch(batch: dict[str, tuple[int, dict]], report: ImportReport):
+    """
+    Запись пакета товаров одной транзакцией: существующие товары (по артикулу) обновляются, новые добавляются.
+    При ошибке записи пакета товары записываются по одному, чтобы в отчёте были отмечены только ошибочные строки.
+    :param batch: Пакет: артикул - номер строки файла и значения полей товара.
+    :param report: Отчёт о загрузке.
+    """
+    existing = await ProductModel.filter(item_number__in=list(batch))
+    updated, update_fields = [], set()
+    for product in existing:
+        line, data = batch[product.item_number]
+        for field, value in data.items():
+            setattr(product, field, value)
+        update_fields.update(data)
+        updated.append((line, product))
+    found = {product.item_number for product in existing}
+    created = []
+    for item_number, (line, data) in batch.items():
+        if item_number in found:
+            continue
+        missing = [field for field in REQUIRED_FIELDS if field not in data]
+        if missing:
+            report.error(line, f'Для нового товара не указаны поля: {", ".join(missing)}')
+            continue
+        created.append((line, ProductModel(item_number=item_number, description=data.pop('description', ''),
+                                           img=data.pop('img', ''), **data)))
+    try:
+        async with in_transaction() as conn:
+            if created:
+                await ProductModel.bulk_create([product for _, product in created], using_db=conn)
+            if updated and update_fields:
+                await ProductModel.bulk_update([product for _, product in updated], fields=list(update_fields),
+                                               using_db=conn)
+    except Exception:
+        await write_rows(created, updated, list(update_fields), report)
+        return
+    report.created += len(created)
+    report.updated += len(updated)
+
+
+async def write_rows(created: list[tuple[int, ProductModel]], updated: list[tuple[int, ProductModel]],
+                     update_fields: list[str], report: ImportReport):
+    """
+    Запись товаров пакета по одному после ошибки записи пакета. Строки, которые не удалось записать, отмечаются
+    в отчёте как ошибочные, остальные строки записываются.
+    :param created: Новые товары: номер строки файла и товар.
+    :param updated: Изменённые товары: номер строки файла и товар.
+    :param update_fields: Изменяемые поля товаров.
+    :param report: Отчёт о загрузке.
+    """
+    for line, product in created:
+        product.id = None
+        try:
+            await product.save(force_create=True)
+        except Exception as error:
+            report.error(line, f'Ошибка записи в базу данных: {error}')
+        else:
+            report.created += 1
+    if not update_fields:
+        report.updated += len(updated)
+        return
+    for line, product in updated:
+        try:
+            await product.save(update_fields=update_fields)
+        except Exception as error:
+            report.error(line, f'Ошибка записи в базу данных: {error}')
+        else:
+            report.updated += 1
+
+
+async def import_products(source: BinaryIO, file_format: str, batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    """
+    Загрузка товаров из файла. Файл читается построчно, строки записываются пакетами. Товар определяется по
+    артикулу (item_number): существующий товар обновляется полями, указанными в строке, новый товар добавляется.
+    Ошибочные строки пропускаются и отражаются в отчёте.
+    :param source: Файл, открытый в двоичном режиме.
+    :param file_format: Формат файла: csv или jsonl.
+    :param batch_size: Количество строк в пакете.
+    :return: Отчёт о загрузке.
+    """
+    report = ImportReport()
+    categories = await load_category_map()
+    batch = {}
+    for line, row, message in read_rows(source, file_format):
+        if row is None:
+            report.error(line, message)
+            continue
+        item_number = str(row.get('item_number') or '').strip()
+        if item_number == '':
+            report.error(line, 'Не указан артикул')
+            continue
+        try:
+            data = parse_row(row, categories)
+        except ValueError as error:
+            report.error(line, str(error))
+            continue
+        if item_number in batch:
+            data = {**batch[item_number][1], **data}
+        batch[item_number] = (line, data)
+        if len(batch) >= batch_size:
+            await write_batch(batch, report)
+            batch = {}
+    if batch:
+        await write_batch(batch, report)
+    invalidate_category_counts()
+    return report
+
+
+async def main(file_name: str):
+    """
+    Загрузка товаров из файла.
+    Запуск: python -m app.backend.service.importer <файл.csv|файл.jsonl>
+    :param file_name: Имя файла.
+    """
+    await Tortoise.init(config=tortoise_orm)
+    with open(file_name, 'rb') as source:
+        report = await import_products(source, file_format_by_name(file_name))
+    print(report)
+    for line, message in report.errors:
+        print(f'Строка {line}: {message}')
+
+
+if __name__ == '__main__':
+    run_async(main(sys.argv[1]))
@@ -1,14 +1,25 @@
 import base64
 import math
 import os
+from email.utils import parsedate_to_datetime
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
+from starlette.datastructures import Headers
+from tortoise.queryset import QuerySet
 
 from app.shemas import Product
 from app.models.product import ProductModel
+from app.backend.db.search import count_products, search_products
+from app.backend.service.images import is_digest, image_path
 
 """
 Функции общего назначения
 """
 
+# Срок хранения изображений товаров в кэше браузера, секунд
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
 
 def pagination(list_item: list, page: int, size: int):
     """
@@ -39,26 +50,181 @@ def pagination(list_item: list, page: int, size: int):
     return result
 
 
-def image_to_str(product: Product | ProductModel, key: str):
+def page_offset(count: int, page: int, size: int):
+    """
+    Вычисление смещения первой записи страницы и данных для навигации по страницам.
+    :param count: Общее количество элементов.
+    :param page: Номер страницы.
+    :param size: Количество элементов на странице.
+    :return: Смещение первой записи страницы и данные для навигации по страницам в формате pagination.
+    """
+    if page < 0:
+        page = 0
+    offset = page * size
+    if offset > count:
+        if size > count:
+            offset = 0
+        else:
+            offset = count - size
+    result = offset, {
+        "page": page,
+        "size": size,
+        "total": math.ceil(count / size) - 1,
+        "pages": [x for x in range(math.ceil(count / size))]
+    }
+    return result
+
+
+async def pagination_queryset(queryset: QuerySet, page: int, size: int):
+    """
+    Разделение результата запроса к базе данных на страницы. Из базы данных выбираются только записи указанной
+    страницы (LIMIT/OFFSET) и общее количество записей (COUNT).
+    :param queryset: Запрос, результат которого необходимо разбить на страницы.
+    :param page: Номер страницы.
+    :param size: Количество элементов на странице.
+    :return: Запрос, ограниченный указанной страницей, и данные для навигации по страницам в формате pagination.
+    """
+    offset, service = page_offset(await queryset.count(), page, size)
+    return queryset.offset(offset).limit(size), service
+
+
+async def pagination_search(q: str, page: int, size: int, fields: tuple[str, ...] = ()):
+    """
+    Разделение результата полнотекстового поиска товаров на страницы. Товары на странице упорядочены по
+    релевантности.
+    :param q: Строка поиска.
+    :param page: Номер страницы.
+    :param size: Количество элементов на странице.
+    :param fields: Выбираемые поля товара, по умолчанию все поля.
+    :return: Список товаров страницы и данные для навигации по страницам в формате pagination.
+    """
+    offset, service = page_offset(await count_products(q), page, size)
+    ids = await search_products(q, size, offset)
+    queryset = ProductModel.filter(id__in=ids)
+    if fields:
+        queryset = queryset.only(*fields)
+    products = {product.id: product for product in await queryset}
+    return [products[product_id] for product_id in ids if product_id in products], service
+
+
+def encode_cursor(value: int) -> str:
+    """
+    Преобразование значения ключа в непрозрачный токен курсора.
+    :param value: Значение ключа последней (первой) записи страницы.
+    :return: Токен курсора.
+    """
+    return base64.urlsafe_b64encode(str(value).encode('utf-8')).decode('utf-8').rstrip('=')
+
+
+def decode_cursor(token: str) -> int | None:
+    """
+    Получение значения ключа из токена курсора.
+    :param token: Токен курсора.
+    :return: Значение ключа или None, если токен пуст или повреждён.
+    """
+    if not token:
+        return None
+    try:
+        return int(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+async def pagination_cursor(queryset: QuerySet, size: int, after: str = '', before: str = '', field: str = 'id',
+                            descending: bool = False, flat: bool = False):
+    """
+    Разделение результата запроса к базе данных на страницы по ключу (keyset). Вместо пропуска записей (OFFSET)
+    выполняется отбор записей с ключом больше (меньше) ключа границы предыдущей страницы, поэтому стоимость
+    получения любой страницы одинакова.
+    :param queryset: Запрос, результат которого необходимо разбить на страницы.
+    :param size: Количество элементов на странице.
+    :param after: Токен курсора: страница после записи с указанным ключом.
+    :param before: Токен курсора: страница перед записью с указанным ключом.
+    :param field: Поле ключа, по которому выполняется разбиение на страницы.
+    :param descending: Порядок сортировки по убыванию ключа.
+    :param flat: Выбирать только различные значения ключа вместо объектов.
+    :return: Список элементов страницы и данные для навигации по страницам: токены предыдущей и следующей страницы.
+    """
+    after_value = decode_cursor(after)
+    before_value = decode_cursor(before)
+    forward = before_value is None
+    if not forward:
+        queryset = queryset.filter(**{f'{field}__{"gt" if descending else "lt"}': before_value})
+    elif after_value is not None:
+        queryset = queryset.filter(**{f'{field}__{"lt" if descending else "gt"}': after_value})
+    queryset = queryset.order_by(('-' if descending == forward else '') + field).limit(size + 1)
+    if flat:
+        queryset = queryset.distinct().values_list(field, flat=True)
+    items = list(await queryset)
+    has_more = len(items) > size
+    items = items[:size]
+    if not forward:
+        items.reverse()
+    keys = items if flat else [getattr(item, field) for item in items]
+    has_prev = has_more if not forward else after_value is not None
+    has_next = has_more if forward else True
+    result = items, {
+        "size": size,
+        "cursor": True,
+        "prev": encode_cursor(keys[0]) if keys and has_prev else None,
+        "next": encode_cursor(keys[-1]) if keys and has_next else None
+    }
+    return result
+
+
+def image_url(product: Product | ProductModel, key: str) -> str:
+    """
+    Получение адреса варианта изображения товара. Изображение из хранилища по хэшу содержимого адресуется хэшем и
+    никогда не меняется. Адрес прежнего изображения содержит версию исходного файла, поэтому оно обновляется в кэше
+    браузера после замены файла.
+    :param product: Модель продукта, для которого определяется адрес изображения.
+    :param key: Ключ варианта изображения: list, page, zoom или lqip.
+    :return: Адрес изображения.
+    """
+    if is_digest(product.img):
+        return f'/product/image/content/{product.img}/{key}'
+    try:
+        version = int(os.stat(image_path(product)).st_mtime)
+    except OSError:
+        version = 0
+    return f'/product/image/{product.id}/{key}?v={version}'
+
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    """
+    Проверка условных заголовков запроса: If-None-Match и If-Modified-Since.
+    :param response_headers: Заголовки ответа с ETag и Last-Modified файла.
+    :param request_headers: Заголовки запроса.
+    :return: True - у клиента актуальная копия файла, False - файл необходимо передать.
+    """
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+        etag = response_headers['etag']
+        return etag in [tag.strip(' W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    try:
+        if_modified_since = parsedate_to_datetime(request_headers['if-modified-since'])
+        last_modified = parsedate_to_datetime(response_headers['last-modified'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return last_modified <= if_modified_since
+
+
+def image_response(request: Request, file_path: str, immutable: bool = False) -> Response:
     """
-    Преобразование изображения в строку символов.
-    :param product: Модель продукта для которого выполняется преобразование картинки в строку.
-    :param key: Ключ определяющий размер картинки для отображения.
-    :return: Строка символов соответствующая изображению переданному продукту.
+    Ответ с файлом изображения. Файл передаётся с заголовками ETag, Last-Modified и длительным сроком кэширования,
+    при совпадении условных заголовков запроса возвращается ответ 304 без содержимого.
+    :param request: Запрос.
+    :param file_path: Путь к файлу изображения.
+    :param immutable: Содержимое по этому адресу никогда не меняется.
+    :return: Ответ с файлом изображения или ответ 304.
     """
-    path = os.getcwd()
-    if 'app' not in path:
-        path += '/app'
-    if key == 'list':
-        file_path = os.path.join(path+"/templates/product/image/" + product.name, 'small_' + product.img)
-    else:
-        file_path = os.path.join(path+"/templates/product/image/" + product.name, product.img)
     try:
-        with open(file_path, "rb") as image_file:
-            contents = image_file.read()
-        base64_encoded_image = base64.b64encode(contents).decode("utf-8")
-        _, format_file = os.path.splitext(file_path)
-    except Exception:
-        base64_encoded_image = ''
-        format_file = 'jpeg'
-    return base64_encoded_image, format_file
+        stat_result = os.stat(file_path)
+    except OSError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='Изображение отсутствует')
+    cache_control = f'public, max-age={IMAGE_MAX_AGE}' + (', immutable' if immutable else '')
+    response = FileResponse(file_path, stat_result=stat_result, headers={'cache-control': cache_control})
+    if is_not_modified(response.headers, request.headers):
+        headers = {name: response.headers[name] for name in ('etag', 'last-modified', 'cache-control')}
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return response
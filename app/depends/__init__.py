@@ -1,5 +1,10 @@
-from .buy import check_use_product
-from .category import get_categories, get_category, find_category, get_categories_subgroups, get_category_model
-from .product import get_product, check_use_category, update_count_product, get_product_model
-from .shop import get_shop_list, get_shop, get_shop_model
+from .buy import check_use_product, next_order_number
+from .cart import CarView, get_cart, add_cart_item, remove_cart_item, clear_cart, sweep_reservations, \
+    reservation_stats
+from .category import get_categories, get_category_tree, get_category_model, category_created, category_moved, \
+    category_deleted, create_category, move_category, subtree_bound
+from .product import get_product, check_use_category, update_count_product, get_product_model, \
+    get_category_counts, invalidate_category_counts, bulk_update_products, select_products, filter_products, \
+    list_products, parse_price, SORT_ORDERS
+from .shop import get_shop_list, get_shop, get_shop_model, invalidate_shops
 from .user import get_current_user, find_user_by_id, get_user_model
@@ -1,4 +1,11 @@
-from app.models.buy import BuyerProd
+from tortoise.expressions import F
+from tortoise.functions import Max
+from tortoise.transactions import in_transaction
+
+from app.models.buy import BuyerProd, OrderSequence
+
+# Название последовательности номеров заказов
+ORDER_SEQUENCE = 'order'
 
 
 async def check_use_product(product: int):
@@ -12,3 +19,18 @@ async def check_use_product(product: int):
         return True
     else:
         return False
+
+
+async def next_order_number() -> int:
+    """
+    Получение следующего номера заказа из последовательности номеров. Номер увеличивается одним запросом UPDATE,
+    поэтому параллельные заказы получают разные номера. При вызове в транзакции записи заказа номер выдаётся
+    в этой же транзакции. При первом вызове последовательность начинается с наибольшего номера имеющихся заказов.
+    :return: Номер заказа.
+    """
+    async with in_transaction():
+        if not await OrderSequence.filter(name=ORDER_SEQUENCE).update(value=F('value') + 1):
+            max_operation = (await BuyerProd.annotate(max_operation=Max('id_operation'))
+                             .values_list('max_operation', flat=True))[0]
+            await OrderSequence.create(name=ORDER_SEQUENCE, value=(max_operation or 0) + 1)
+        return (await OrderSequence.get(name=ORDER_SEQUENCE)).value
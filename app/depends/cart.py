@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from ..models.buy import Cart, CartItem
+
+# Срок резервирования товара в корзине, секунд
+RESERVATION_TTL = int(os.getenv('RESERVATION_TTL', str(30 * 60)))
+# Интервал проверки просроченных резервов, секунд
+SWEEP_INTERVAL = int(os.getenv('SWEEP_INTERVAL', '60'))
+# Количество резервов, освобождаемых одной транзакцией
+SWEEP_BATCH_SIZE = 200
+
+logger = logging.getLogger(__name__)
+
+# Статистика освобождения просроченных резервов
+reservation_stats = {'sweeps': 0, 'released_items': 0, 'reclaimed_units': 0}
+
+
+class CarView:
+    """
+    Класс представляющий товар в корзине пользователя
+    """
+    def __init__(self, number, id_prod, name, price, count):
+        self.number = number
+        self.id_prod = id_prod
+        self.name = name
+        self.price = price
+        self.count = count
+
+
+async def get_cart(user_id: int) -> list[CarView]:
+    """
+    Получение товаров корзины пользователя. Товары с истёкшим сроком резервирования не выводятся.
+    :param user_id: Идентификатор пользователя.
+    :return: Список товаров корзины, пустой список - корзина пуста.
+    """
+    items = await CartItem.filter(cart__user_id=user_id, expires_at__gt=timezone.now()).order_by('id') \
+        .values('id', 'product_id', 'product__name', 'product__price', 'count')
+    return [CarView(item['id'], item['product_id'], item['product__name'], item['product__price'], item['count'])
+            for item in items]
+
+
+async def add_cart_item(user_id: int, product_id: int, count: int) -> CartItem:
+    """
+    Добавление товара в корзину пользователя. Корзина создаётся при добавлении первого товара. Срок
+    резервирования товаров корзины продлевается.
+    :param user_id: Идентификатор пользователя.
+    :param product_id: Идентификатор товара.
+    :param count: Количество товара.
+    :return: Товар в корзине.
+    """
+    cart, _ = await Cart.get_or_create(user_id=user_id)
+    expires_at = timezone.now() + timedelta(seconds=RESERVATION_TTL)
+    await CartItem.filter(cart=cart, expires_at__gt=timezone.now()).update(expires_at=expires_at)
+    return await CartItem.create(cart=cart, product_id=product_id, count=count, expires_at=expires_at)
+
+
+async def remove_cart_item(user_id: int, number: int) -> bool:
+    """
+    Удаление товара из корзины пользователя с возвратом количества товара в остаток.
+    :param user_id: Идентификатор пользователя.
+    :param number: Номер товара в корзине.
+    :return: True - товар удалён, False - товара нет в корзине.
+    """
+    async with in_transaction():
+        ids = await CartItem.filter(id=number, cart__user_id=user_id).values_list('id', flat=True)
+        released, _ = await release_items(ids)
+    return released > 0
+
+
+async def clear_cart(user_id: int, sold: tuple[int, ...] | list[int] = ()):
+    """
+    Удаление корзины пользователя. Количество товаров корзины возвращается в остаток, кроме товаров, вошедших
+    в заказ. Товары с истёкшим сроком резервирования, ещё не освобождённые фоновой задачей, также возвращаются
+    в остаток.
+    :param user_id: Идентификатор пользователя.
+    :param sold: Номера товаров корзины, вошедших в заказ.
+    """
+    async with in_transaction():
+        ids = await CartItem.filter(cart__user_id=user_id).exclude(id__in=list(sold)).values_list('id', flat=True)
+        await release_items(ids)
+        await Cart.filter(user_id=user_id).delete()
+
+
+async def release_items(ids: list[int]) -> tuple[int, int]:
+    """
+    Удаление товаров из корзин с возвратом количества в остаток. Товары удаляются одним запросом DELETE ... RETURNING,
+    количество возвращается одним запросом UPDATE и только за товары, удалённые этим вызовом, поэтому параллельное
+    удаление того же товара не возвращает количество дважды.
+    :param ids: Номера товаров в корзинах.
+    :return: Количество удалённых товаров корзин и возвращённое количество товаров.
+    """
+    if not ids:
+        return 0, 0
+    async with in_transaction() as conn:
+        rows = await conn.execute_query_dict(
+            f'DELETE FROM "cart_items" WHERE "id" IN ({", ".join("?" for _ in ids)}) RETURNING "product_id", "count"',
+            list(ids))
+        products = {}
+        for row in rows:
+            products[row['product_id']] = products.get(row['product_id'], 0) + row['count']
+        if products:
+            values = [value for item in products.items() for value in item]
+            case = ' '.join('WHEN ? THEN ?' for _ in products)
+            await conn.execute_query(
+                f'UPDATE "products" SET "count" = "count" + CASE "id" {case} ELSE 0 END '
+                f'WHERE "id" IN ({", ".join("?" for _ in products)})', values + list(products))
+    return len(rows), sum(products.values())
+
+
+async def release_expired_reservations(batch_size: int = SWEEP_BATCH_SIZE) -> tuple[int, int]:
+    """
+    Освобождение товаров корзин с истёкшим сроком резервирования: товары удаляются из корзин, количество
+    возвращается в остаток. Резервы выбираются по индексу срока резервирования пакетами, каждый пакет
+    освобождается одной транзакцией.
+    :param batch_size: Количество резервов в пакете.
+    :return: Количество освобождённых резервов и возвращённое количество товаров.
+    """
+    released, reclaimed = 0, 0
+    while True:
+        ids = await CartItem.filter(expires_at__lte=timezone.now()).order_by('expires_at').limit(batch_size) \
+            .values_list('id', flat=True)
+        if not ids:
+            break
+        batch_released, batch_reclaimed = await release_items(ids)
+        released += batch_released
+        reclaimed += batch_reclaimed
+        if len(ids) < batch_size:
+            break
+    reservation_stats['sweeps'] += 1
+    reservation_stats['released_items'] += released
+    reservation_stats['reclaimed_units'] += reclaimed
+    return released, reclaimed
+
+
+async def sweep_reservations(interval: int = SWEEP_INTERVAL):
+    """
+    Фоновая задача: периодическое освобождение товаров корзин с истёкшим сроком резервирования.
+    :param interval: Интервал проверки, секунд.
+    """
+    while True:
+        try:
+            released, reclaimed = await release_expired_reservations()
+            if released:
+                logger.info('Освобождено резервов: %s, возвращено товаров: %s', released, reclaimed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Ошибка освобождения резервов')
+        await asyncio.sleep(interval)
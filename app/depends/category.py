@@ -1,32 +1,128 @@
+from tortoise.transactions import in_transaction
+
+from ..backend.service.cache import ReferenceCache
 from ..models.category import Categories
 from ..shemas import category_pydantic
 
+categories_cache = ReferenceCache('categories')
+
 
-def get_categories_subgroups(list_categories, id_category) -> list[category_pydantic]:
+class CategoryTree:
     """
-    Получение списка подкатегорий для категории указанной идентификатором.
-    :param list_categories: Список всех категорий
-    :param id_category: Идентификатор категории
-    :return: Список категорий для которых указанный идентификатор является родительским
+    Класс - дерево категорий. Хранит категории по идентификатору, списки подкатегорий для каждой категории и
+    цепочки родителей, поэтому получение категории, подкатегорий и цепочки выполняется за постоянное время.
     """
-    result = []
-    for category in list_categories:
-        if category.parent == id_category:
-            result.append(category)
-    return result
 
+    def __init__(self, categories: list[category_pydantic]):
+        """
+        Построение дерева категорий.
+        :param categories: Список всех категорий.
+        """
+        self.nodes = {}
+        self.children = {}
+        self.paths = {}
+        for category in categories:
+            self.nodes[category.id] = category
+            self.children.setdefault(category.parent, []).append(category.id)
+        for category in categories:
+            if category.parent not in self.nodes:
+                self._update_paths(category.id)
 
-def get_category(list_categories, id_category) -> category_pydantic | None:
-    """
-    Получение объекта категория по идентификатору
-    :param list_categories: Список всех категорий
-    :param id_category: Идентификатор категории
-    :return: Объект категория или None
-    """
-    for category in list_categories:
-        if category.id == id_category:
-            return category
-    return None
+    @property
+    def categories(self) -> list[category_pydantic]:
+        """
+        Список всех категорий.
+        """
+        return list(self.nodes.values())
+
+    def get(self, id_category) -> category_pydantic | None:
+        """
+        Получение категории по идентификатору.
+        :param id_category: Идентификатор категории.
+        :return: Категория или None.
+        """
+        return self.nodes.get(id_category)
+
+    def subgroups(self, id_category) -> list[category_pydantic]:
+        """
+        Получение списка подкатегорий.
+        :param id_category: Идентификатор категории.
+        :return: Список категорий, для которых указанная категория является родительской.
+        """
+        return [self.nodes[child] for child in self.children.get(id_category, [])]
+
+    def path(self, id_category) -> str:
+        """
+        Получение цепочки родителей категории.
+        :param id_category: Идентификатор категории.
+        :return: Строка вида 'Родитель / Категория' или ''.
+        """
+        return self.paths.get(id_category, '')
+
+    def add(self, category: category_pydantic):
+        """
+        Добавление новой категории.
+        :param category: Категория.
+        """
+        self.nodes[category.id] = category
+        self.children.setdefault(category.parent, []).append(category.id)
+        self._update_paths(category.id)
+
+    def move(self, id_category, parent: int):
+        """
+        Изменение родительской категории. Цепочки родителей пересчитываются для категории и всех её потомков.
+        :param id_category: Идентификатор категории.
+        :param parent: Идентификатор новой родительской категории.
+        """
+        category = self.nodes.get(id_category)
+        if category is None:
+            return
+        self._detach(category)
+        self.nodes[id_category] = category.model_copy(update={'parent': parent})
+        self.children.setdefault(parent, []).append(id_category)
+        self._update_paths(id_category)
+
+    def remove(self, id_category):
+        """
+        Удаление категории. Подкатегории удалённой категории становятся категориями верхнего уровня.
+        :param id_category: Идентификатор категории.
+        """
+        category = self.nodes.pop(id_category, None)
+        if category is None:
+            return
+        self._detach(category)
+        self.paths.pop(id_category, None)
+        for child in self.children.get(id_category, []):
+            self._update_paths(child)
+
+    def _detach(self, category: category_pydantic):
+        """
+        Удаление категории из списка подкатегорий её родителя.
+        :param category: Категория.
+        """
+        siblings = self.children.get(category.parent, [])
+        self.children[category.parent] = [child for child in siblings if child != category.id]
+
+    def _update_paths(self, id_category):
+        """
+        Вычисление цепочки родителей и пути от корня дерева для категории и всех её потомков.
+        :param id_category: Идентификатор категории.
+        """
+        stack = [id_category]
+        seen = set()
+        while stack:
+            category = self.nodes[stack.pop()]
+            # защита от зацикливания при ошибочном назначении потомка родителем
+            if category.id in seen:
+                continue
+            seen.add(category.id)
+            parent = self.nodes.get(category.parent)
+            parent_path = self.paths.get(category.parent, '') if parent is not None else ''
+            self.paths[category.id] = parent_path + ' / ' + category.name if parent_path else category.name
+            path = (parent.path if parent is not None else '/') + f'{category.id}/'
+            if category.path != path:
+                self.nodes[category.id] = category.model_copy(update={'path': path})
+            stack.extend(self.children.get(category.id, []))
 
 
 async def get_category_model(id_category) -> Categories | None:
@@ -38,30 +134,102 @@ async def get_category_model(id_category) -> Categories | None:
     return await Categories.get_or_none(id=id_category)
 
 
-def find_category(categories, id_category) -> str:
+async def load_category_tree() -> CategoryTree:
     """
-    Вывод зависимости категорий для указанного идентификатора
-    :param categories: Список всех категорий
-    :param id_category: Идентификатор категории
-    :return: строка представляющая цепочку родителей для указанной категории
+    Загрузка дерева категорий из базы данных
+    :return: Дерево категорий
     """
-    if id_category is None or id_category == -1:
-        return ''
-    for category in categories:
-        if category.id == id_category:
-            if category.parent is None or category.parent == -1:
-                return category.name
-            else:
-                return find_category(categories, category.parent) + ' / ' + category.name
-    return ''
+    return CategoryTree(await category_pydantic.from_queryset(Categories.all()))
+
+
+async def get_category_tree() -> CategoryTree:
+    """
+    Получение дерева категорий. Дерево хранится в кэше.
+    :return: Дерево категорий
+    """
+    return await categories_cache.get('tree', load_category_tree)
 
 
 async def get_categories():
     """
-    Получение списка категорий введённых в базу
+    Получение списка категорий введённых в базу. Список хранится в кэше.
     :return: Список категорий
     """
-    categories = await category_pydantic.from_queryset(Categories.all())
+    categories = (await get_category_tree()).categories
     if not categories:
         return None
     return categories
+
+
+async def create_category(name: str, parent: int) -> Categories:
+    """
+    Создание категории. Путь от корня дерева вычисляется по пути родительской категории.
+    :param name: Название категории.
+    :param parent: Идентификатор родительской категории.
+    :return: Созданная категория.
+    """
+    parent_category = await Categories.get_or_none(id=parent)
+    parent_path = parent_category.path if parent_category is not None else '/'
+    async with in_transaction():
+        category = await Categories.create(name=name, parent=parent)
+        category.path = f'{parent_path}{category.id}/'
+        await category.save(update_fields=['path'])
+    return category
+
+
+async def move_category(id_category: int, parent: int) -> bool:
+    """
+    Изменение родительской категории. Путь от корня дерева изменяется для категории и всех её потомков одним
+    запросом по индексу пути.
+    :param id_category: Идентификатор категории.
+    :param parent: Идентификатор новой родительской категории.
+    :return: True - категория перемещена, False - категория не найдена или новый родитель является её потомком.
+    """
+    category = await Categories.get_or_none(id=id_category)
+    if category is None:
+        return False
+    parent_category = await Categories.get_or_none(id=parent)
+    parent_path = parent_category.path if parent_category is not None else '/'
+    if parent_path.startswith(category.path):
+        return False
+    async with in_transaction() as conn:
+        await Categories.filter(id=id_category).using_db(conn).update(parent=parent)
+        await conn.execute_query(
+            'UPDATE "categories" SET "path" = ? || substr("path", ?) WHERE "path" >= ? AND "path" < ?',
+            [f'{parent_path}{id_category}/', len(category.path) + 1, category.path, subtree_bound(category.path)])
+    return True
+
+
+def subtree_bound(path: str) -> str:
+    """
+    Верхняя граница путей поддерева категории. Пути потомков категории лежат в интервале [path, граница), поэтому
+    поддерево выбирается по индексу пути сравнением, а не LIKE.
+    :param path: Путь категории от корня дерева.
+    :return: Граница путей поддерева.
+    """
+    return path[:-1] + chr(ord('/') + 1)
+
+
+def category_created(category: Categories):
+    """
+    Добавление созданной категории в дерево категорий.
+    :param category: Созданная категория.
+    """
+    categories_cache.update('tree', lambda tree: tree.add(category_pydantic.model_validate(category)))
+
+
+def category_moved(id_category: int, parent: int):
+    """
+    Изменение родительской категории в дереве категорий.
+    :param id_category: Идентификатор категории.
+    :param parent: Идентификатор новой родительской категории.
+    """
+    categories_cache.update('tree', lambda tree: tree.move(id_category, parent))
+
+
+def category_deleted(id_category: int):
+    """
+    Удаление категории из дерева категорий.
+    :param id_category: Идентификатор удалённой категории.
+    """
+    categories_cache.update('tree', lambda tree: tree.remove(id_category))
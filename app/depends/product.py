@@ -1,5 +1,25 @@
+from tortoise.expressions import F, Q
+from tortoise.functions import Count
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from ..backend.db.search import search_available
+from ..backend.service.cache import ReferenceCache
+from ..backend.service.service import pagination_queryset, pagination_cursor, pagination_search
 from ..models.product import ProductModel
-from ..shemas import product_pydantic
+from ..shemas import product_pydantic, ProductChange
+from .category import get_category_tree, subtree_bound
+
+category_counts_cache = ReferenceCache('category_counts')
+# Количество товаров, изменяемых одним запросом UPDATE
+BULK_UPDATE_BATCH_SIZE = 200
+# Порядок сортировки списка товаров: значение параметра sort - поля сортировки
+SORT_ORDERS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'name': ('name', 'id'),
+    'new': ('-id',),
+}
 
 
 async def check_use_category(category: int):
@@ -35,11 +55,222 @@ async def get_product_model(product_id: int) -> ProductModel | None:
 
 async def update_count_product(product_id: int, update_count: int) -> bool:
     """
-    Изменение количества товара
+    Изменение количества товара одним запросом UPDATE относительно текущего значения в базе данных. Уменьшение
+    выполняется, только если товара достаточно, поэтому параллельные покупки не уводят остаток в минус.
     :param product_id: Идентификатор товара.
     :param update_count: Изменение количества + увеличение, - уменьшение.
-    :return статус операции
+    :return: True - количество изменено, False - товар не найден или товара недостаточно.
+    """
+    queryset = ProductModel.filter(id=product_id)
+    if update_count < 0:
+        queryset = queryset.filter(count__gte=-update_count)
+    return await queryset.update(count=F('count') + update_count) > 0
+
+
+async def load_category_counts() -> dict[int, int]:
+    """
+    Подсчёт количества доступных товаров в каждой категории вместе с её подкатегориями. Количество товаров
+    по категориям выбирается одним запросом с группировкой и суммируется по цепочке родительских категорий.
+    :return: Словарь: идентификатор категории - количество доступных товаров.
+    """
+    rows = await ProductModel.filter(is_active=True).annotate(total=Count('id')).group_by('category_id') \
+        .values_list('category_id', 'total')
+    tree = await get_category_tree()
+    counts = {}
+    for id_category, total in rows:
+        seen = set()
+        while id_category is not None and id_category not in seen:
+            seen.add(id_category)
+            counts[id_category] = counts.get(id_category, 0) + total
+            category = tree.get(id_category)
+            id_category = category.parent if category is not None else None
+    return counts
+
+
+async def get_category_counts() -> dict[int, int]:
+    """
+    Получение количества доступных товаров по категориям. Данные хранятся в кэше.
+    :return: Словарь: идентификатор категории - количество доступных товаров.
+    """
+    return await category_counts_cache.get('counts', load_category_counts)
+
+
+def invalidate_category_counts():
+    """
+    Сброс количества товаров по категориям в кэше после создания, изменения или снятия товара с продажи.
+    """
+    category_counts_cache.invalidate()
+
+
+async def bulk_update_products(changes: list[ProductChange]) -> dict:
+    """
+    Изменение цены, количества и доступности списка товаров в одной транзакции. Товар определяется по
+    идентификатору или артикулу. Изменения записываются пакетами: один запрос UPDATE с выражениями CASE на пакет
+    товаров. Количество изменяется относительно текущего значения в базе данных и не становится меньше нуля:
+    товары, количество которых было ограничено нулём, выводятся в итогах отдельно (clamped) с запрошенным и
+    фактическим изменением количества и в количество изменённых по полю count не включаются.
+    :param changes: Список изменений товаров.
+    :return: Итоги изменения: количество изменённых товаров по полям, товары с ограниченным изменением
+    количества, ненайденные товары и ошибки.
+    """
+    result = {'products': 0, 'price': 0, 'count': 0, 'is_active': 0, 'clamped': [], 'not_found': [], 'errors': []}
+    ids = [change.id for change in changes if change.id is not None]
+    item_numbers = [change.item_number for change in changes if change.id is None and change.item_number]
+    products = await ProductModel.filter(Q(id__in=ids) | Q(item_number__in=item_numbers)) \
+        .values('id', 'item_number', 'price', 'is_active')
+    by_id = {product['id']: product for product in products}
+    by_item_number = {product['item_number']: product for product in products}
+    updates = {}
+    for index, change in enumerate(changes):
+        if change.id is None and not change.item_number:
+            result['errors'].append({'index': index, 'message': 'Не указан идентификатор или артикул товара'})
+            continue
+        product = by_id.get(change.id) if change.id is not None else by_item_number.get(change.item_number)
+        if product is None:
+            result['not_found'].append(change.id if change.id is not None else change.item_number)
+            continue
+        if change.price is not None and change.price < 0:
+            result['errors'].append({'index': index, 'message': 'Цена не может быть отрицательной'})
+            continue
+        update = updates.setdefault(product['id'], {})
+        if change.price is not None and change.price != product['price']:
+            update['price'] = change.price
+        if change.count_delta:
+            update['count_delta'] = update.get('count_delta', 0) + change.count_delta
+        if change.is_active is not None and change.is_active != product['is_active']:
+            update['is_active'] = change.is_active
+    updates = {id_product: update for id_product, update in updates.items() if update}
+    items = list(updates.items())
+    async with in_transaction() as conn:
+        for start in range(0, len(items), BULK_UPDATE_BATCH_SIZE):
+            batch = items[start:start + BULK_UPDATE_BATCH_SIZE]
+            decreased = [id_product for id_product, update in batch if update.get('count_delta', 0) < 0]
+            if decreased:
+                counts = await ProductModel.filter(id__in=decreased).using_db(conn).values('id', 'count')
+                for product in counts:
+                    delta = updates[product['id']]['count_delta']
+                    if product['count'] + delta < 0:
+                        result['clamped'].append({'id': product['id'], 'count_delta': delta,
+                                                  'applied': -product['count']})
+            sql, values = make_update_sql(batch)
+            await conn.execute_query(sql, values)
+    result['products'] = len(updates)
+    for field, key in (('price', 'price'), ('count', 'count_delta'), ('is_active', 'is_active')):
+        result[field] = sum(1 for update in updates.values() if key in update)
+    result['count'] -= len(result['clamped'])
+    if result['is_active']:
+        invalidate_category_counts()
+    return result
+
+
+def make_update_sql(items: list[tuple[int, dict]]) -> tuple[str, list]:
+    """
+    Формирование запроса UPDATE с выражениями CASE для пакета изменений товаров.
+    :param items: Список: идентификатор товара - изменения.
+    :return: Текст запроса и значения параметров.
+    """
+    columns, values = [], []
+    for field, key in (('price', 'price'), ('count', 'count_delta'), ('is_active', 'is_active')):
+        changed = [(id_product, update[key]) for id_product, update in items if key in update]
+        if not changed:
+            continue
+        case = ' '.join('WHEN ? THEN ?' for _ in changed)
+        for id_product, value in changed:
+            values.extend((id_product, value))
+        if field == 'count':
+            columns.append(f'"count" = MAX("count" + CASE "id" {case} ELSE 0 END, 0)')
+        else:
+            columns.append(f'"{field}" = CASE "id" {case} ELSE "{field}" END')
+    ids = [id_product for id_product, update in items]
+    values.extend(ids)
+    sql = f'UPDATE "products" SET {", ".join(columns)} WHERE "id" IN ({", ".join("?" for _ in ids)})'
+    return sql, values
+
+
+async def select_products(category: str = '', q: str = '') -> QuerySet:
+    """
+    Запрос списка товаров выбранной категории вместе с её подкатегориями или товаров, название или описание
+    которых содержит строку поиска.
+    :param category: Идентификатор категории.
+    :param q: Строка поиска.
+    :return: Запрос списка товаров.
+    """
+    if q != '':
+        querty = Q(join_type=Q.OR, name__icontains=q, description__icontains=q)
+        return ProductModel.filter(querty)
+    elif category != '':
+        node = (await get_category_tree()).get(int(category))
+        if node is not None and node.path:
+            return ProductModel.filter(category__path__gte=node.path, category__path__lt=subtree_bound(node.path))
+        return ProductModel.filter(category=int(category))
+    return ProductModel.filter()
+
+
+def parse_price(value: str) -> float | None:
+    """
+    Преобразование значения параметра цены из формы отбора товаров. Пустое или неверное значение означает
+    отсутствие условия.
+    :param value: Значение параметра.
+    :return: Цена или None.
+    """
+    try:
+        return float(value) if value.strip() != '' else None
+    except ValueError:
+        return None
+
+
+def filter_products(queryset: QuerySet, price_min: float | None = None, price_max: float | None = None,
+                    action: str = '', in_stock: str = '', is_active: str = '') -> QuerySet:
+    """
+    Ограничение запроса списка товаров условиями отбора. Пустое значение (None) параметра означает отсутствие условия.
+    :param queryset: Запрос списка товаров.
+    :param price_min: Минимальная цена товара.
+    :param price_max: Максимальная цена товара.
+    :param action: Признак отбора товаров, участвующих в акции.
+    :param in_stock: Признак отбора товаров в наличии.
+    :param is_active: Признак отбора доступных товаров.
+    :return: Запрос с условиями отбора.
+    """
+    if price_min is not None:
+        queryset = queryset.filter(price__gte=price_min)
+    if price_max is not None:
+        queryset = queryset.filter(price__lte=price_max)
+    if action != '':
+        queryset = queryset.filter(action=True)
+    if in_stock != '':
+        queryset = queryset.filter(is_active=True, count__gt=0)
+    if is_active != '':
+        queryset = queryset.filter(is_active=True)
+    return queryset
+
+
+async def list_products(fields: tuple[str, ...], size: int, category: str = '', q: str = '',
+                        filters: dict | None = None, sort: str = '', page: int = 0, cursor: bool = False,
+                        after: str = '', before: str = '') -> tuple[list[ProductModel], dict]:
+    """
+    Получение страницы списка товаров. Без условий отбора и сортировки товары, найденные по строке поиска,
+    выбираются полнотекстовым поиском в порядке релевантности. Страницы списка, упорядоченного по идентификатору,
+    могут задаваться токеном курсора, в остальных случаях - номером страницы.
+    :param fields: Выбираемые поля товара.
+    :param size: Количество товаров на странице.
+    :param category: Идентификатор категории, отбираются товары категории и её подкатегорий.
+    :param q: Строка поиска.
+    :param filters: Условия отбора в формате параметров filter_products.
+    :param sort: Порядок сортировки: ключ SORT_ORDERS, по умолчанию по идентификатору.
+    :param page: Номер страницы.
+    :param cursor: Разбиение списка на страницы по курсору.
+    :param after: Токен курсора следующей страницы.
+    :param before: Токен курсора предыдущей страницы.
+    :return: Товары страницы и данные для навигации по страницам.
     """
-    product = await ProductModel.filter(id=product_id).first()
-    await ProductModel.filter(id=product_id).update(count=product.count+update_count)
-    return True
+    filters = filters or {}
+    queryset = filter_products(await select_products(category, q), **filters)
+    order = SORT_ORDERS.get(sort, ('id',))
+    use_cursor = cursor and order[-1] in ('id', '-id')
+    filtered = any(value not in (None, '') for value in filters.values())
+    if q != '' and not use_cursor and search_available() and not filtered and sort == '':
+        return await pagination_search(q, page, size, fields)
+    elif use_cursor:
+        return await pagination_cursor(queryset.only(*fields), size, after, before, descending=order[-1] == '-id')
+    queryset, service = await pagination_queryset(queryset.order_by(*order), page, size)
+    return await queryset.only(*fields), service
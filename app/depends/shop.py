@@ -1,6 +1,9 @@
+from ..backend.service.cache import ReferenceCache
 from ..models.shop import Shops
 from ..shemas import shop_pydantic
 
+shops_cache = ReferenceCache('shops')
+
 
 async def get_shop(shop_id: int) -> shop_pydantic | None:
     """
@@ -20,12 +23,30 @@ async def get_shop_model(shop_id: int) -> Shops | None:
     return await Shops.get_or_none(id=shop_id)
 
 
-async def get_shop_list() -> list[shop_pydantic]:
+async def load_shop_list() -> list[shop_pydantic]:
     """
-    Получение списка доступных магазинов
+    Загрузка списка доступных магазинов из базы данных
     :return: Список магазинов
     """
     shop_list = await shop_pydantic.from_queryset(Shops.filter(is_active=True).all())
     if shop_list is not None:
         shop_list = list(shop_list)
     return shop_list
+
+
+async def get_shop_list() -> list[shop_pydantic]:
+    """
+    Получение списка доступных магазинов. Список хранится в кэше.
+    :return: Список магазинов
+    """
+    shop_list = await shops_cache.get('active', load_shop_list)
+    if shop_list is not None:
+        shop_list = list(shop_list)
+    return shop_list
+
+
+def invalidate_shops():
+    """
+    Сброс кэша магазинов. Вызывается после изменения магазинов.
+    """
+    shops_cache.invalidate()
@@ -1,3 +1,5 @@
+import asyncio
+
 import uvicorn
 from fastapi import FastAPI, Request, Depends
 from fastapi.templating import Jinja2Templates
@@ -6,23 +8,67 @@ from fastapi.responses import RedirectResponse
 from tortoise.contrib.fastapi import register_tortoise
 from typing import Annotated
 from .backend.db.db import tortoise_orm
+from .backend.db.indexes import init_partial_indexes
+from .backend.db.search import init_search_index
+from .backend.service.cache import cache_stats
+from .backend.service.images import UploadLimitMiddleware
 from .shemas import user_pydantic
-from .depends import get_current_user, get_categories
+from .depends import get_current_user, get_categories, sweep_reservations, reservation_stats
 from .routers.users import user_router
 from .routers.product import product_router
 from .routers.shop import shop_router
 from .routers.category import category_router
 from .routers.buy import buy_router
+from .routers.api import api_router
 
 templates = Jinja2Templates(directory='app/templates/product')
 
 api = FastAPI()
 api.mount("/app/static", StaticFiles(directory="app/static"), name="static")
+api.add_middleware(UploadLimitMiddleware)
 register_tortoise(api,
                   config=tortoise_orm,
                   generate_schemas=True, add_exception_handlers=True)
 
 
+@api.on_event('startup')
+async def init_search():
+    """
+    Подготовка полнотекстового индекса товаров. При отсутствии поддержки FTS5 поиск выполняется по вхождению строки.
+    """
+    await init_search_index()
+
+
+@api.on_event('startup')
+async def init_indexes():
+    """
+    Создание частичных индексов товаров, отсутствующих в схеме, созданной generate_schemas.
+    """
+    await init_partial_indexes()
+
+
+@api.on_event('startup')
+async def start_reservation_sweeper():
+    """
+    Запуск фоновой задачи освобождения товаров корзин с истёкшим сроком резервирования.
+    """
+    api.state.sweeper = asyncio.create_task(sweep_reservations())
+
+
+@api.on_event('shutdown')
+async def stop_reservation_sweeper():
+    """
+    Остановка фоновой задачи освобождения резервов.
+    """
+    sweeper = getattr(api.state, 'sweeper', None)
+    if sweeper is not None:
+        sweeper.cancel()
+        try:
+            await sweeper
+        except asyncio.CancelledError:
+            pass
+
+
 @api.get('/')
 async def redirect():
     """
@@ -62,11 +108,37 @@ async def welcome(request: Request, user: Annotated[user_pydantic, Depends(get_c
     return templates.TemplateResponse("main.html", info)
 
 
+@api.get('/cache')
+async def cache_stats_get(user: Annotated[user_pydantic, Depends(get_current_user)]):
+    """
+    Статистика использования кэшей справочных данных: количество попаданий, промахов и записей.
+    :param user: текущий пользователь
+    :return: статистика по каждому кэшу или переадресация на главную страницу, если пользователь не сотрудник
+    """
+    if user is None or not user.is_staff:
+        return RedirectResponse('/main')
+    return cache_stats()
+
+
+@api.get('/reservations')
+async def reservation_stats_get(user: Annotated[user_pydantic, Depends(get_current_user)]):
+    """
+    Статистика освобождения товаров корзин с истёкшим сроком резервирования: количество проверок, освобождённых
+    резервов и возвращённых в остаток единиц товара.
+    :param user: текущий пользователь
+    :return: статистика или переадресация на главную страницу, если пользователь не сотрудник
+    """
+    if user is None or not user.is_staff:
+        return RedirectResponse('/main')
+    return reservation_stats
+
+
 api.include_router(user_router)  # подключение маршрутов управления пользователями
 api.include_router(product_router)  # подключение маршрутов управления товарами
 api.include_router(shop_router)  # подключение маршрутов управления магазинами
 api.include_router(category_router)  # подключение маршрутов управления категорий
 api.include_router(buy_router)  # подключение маршрутов покупки товаров
+api.include_router(api_router)  # подключение программного интерфейса (JSON)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,36 @@
 from tortoise import fields, models
 
+# Статусы заказа
+ORDER_PAID = 'paid'  # оплачен
+ORDER_ISSUED = 'issued'  # выдан
+
+
+class OrderModel(models.Model):
+    """
+    Класс - описание заказа: покупатель, магазин, статус и сумма заказа. Идентификатор является номером заказа.
+    """
+    id = fields.IntField(primary_key=True)
+    user = fields.ForeignKeyField(
+        model_name="models.User",
+        on_delete=fields.CASCADE,
+        related_name="orders",
+    )
+    shop = fields.ForeignKeyField(
+        model_name="models.Shops",
+        on_delete=fields.CASCADE,
+        related_name="orders",
+    )
+    # Временная метка оформления заказа
+    created_at = fields.DatetimeField(auto_now_add=True)
+    # Статус заказа: ORDER_PAID или ORDER_ISSUED
+    status = fields.CharField(max_length=16, default=ORDER_PAID)
+    # Сумма заказа
+    total = fields.FloatField(default=0)
+
+    class Meta:
+        table = 'orders'
+        indexes = (('user', 'id'),)
+
 
 class BuyerProd(models.Model):
     """
@@ -7,6 +38,12 @@ class BuyerProd(models.Model):
     """
     id = fields.IntField(primary_key=True)
     id_operation = fields.IntField(nullable=False)
+    order = fields.ForeignKeyField(
+        model_name="models.OrderModel",
+        on_delete=fields.CASCADE,
+        related_name="lines",
+        null=True,
+    )
     user = fields.ForeignKeyField(
         model_name="models.User",
         on_delete=fields.CASCADE,
@@ -21,6 +58,65 @@ class BuyerProd(models.Model):
     )
     is_used = fields.BooleanField(default=False)
     count = fields.IntField(nullable=False)
+    # дата и время покупки
+    created_at = fields.DatetimeField(auto_now_add=True, null=True)
 
     class Meta:
         table = 'buyer'
+        indexes = (('user', 'id_operation'), ('order', 'id'))
+
+
+class Cart(models.Model):
+    """
+    Класс - описание корзины пользователя
+    """
+    id = fields.IntField(primary_key=True)
+    user = fields.OneToOneField(
+        model_name="models.User",
+        on_delete=fields.CASCADE,
+        related_name="cart",
+    )
+    # Временная метка создания корзины
+    created_at = fields.DatetimeField(auto_now_add=True)
+    # Временная метка последнего изменения корзины
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = 'carts'
+
+
+class CartItem(models.Model):
+    """
+    Класс - описание товара в корзине пользователя. Количество товара в корзине списано с остатка товара
+    (зарезервировано) до окончания резервирования.
+    """
+    id = fields.IntField(primary_key=True)
+    cart = fields.ForeignKeyField(
+        model_name="models.Cart",
+        on_delete=fields.CASCADE,
+        related_name="items",
+    )
+    product = fields.ForeignKeyField(
+        model_name="models.ProductModel",
+        on_delete=fields.CASCADE,
+    )
+    count = fields.IntField(nullable=False)
+    # Временная метка добавления товара в корзину
+    created_at = fields.DatetimeField(auto_now_add=True)
+    # Окончание резервирования товара: после него количество возвращается в остаток
+    expires_at = fields.DatetimeField(null=True, index=True)
+
+    class Meta:
+        table = 'cart_items'
+        indexes = (('cart', 'expires_at'),)
+
+
+class OrderSequence(models.Model):
+    """
+    Класс - счётчик номеров: последний выданный номер последовательности
+    """
+    name = fields.CharField(max_length=64, primary_key=True)
+    value = fields.IntField(default=0)
+
+    class Meta:
+        table = 'sequences'
@@ -8,6 +8,8 @@ class Categories(models.Model):
     id = fields.IntField(primary_key=True)
     name = fields.CharField(max_length=255, unique=True)
     parent = fields.IntField(default=-1)
+    # путь от корня дерева категорий: /1/5/12/
+    path = fields.CharField(max_length=1024, default='', index=True)
 
     class Meta:
         table = 'categories'
@@ -11,7 +11,7 @@ class ProductModel(models.Model):
     # Описание товара
     description = fields.TextField()
     # артикул товара
-    item_number = fields.CharField(max_length=256)
+    item_number = fields.CharField(max_length=256, index=True)
     # стоимость товара
     price = fields.FloatField()
     # доступное количество товара
@@ -30,3 +30,6 @@ class ProductModel(models.Model):
 
     class Meta:
         table = "products"
+        # индексы отбора и сортировки списка товаров; частичные индексы товаров в наличии и товаров по акции
+        # создаются миграцией
+        indexes = (("category_id", "is_active", "price"), ("is_active", "price"), ("is_active", "name"))
@@ -0,0 +1,182 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+
+from ..backend.service.service import pagination_cursor, image_url
+from ..depends import get_category_tree, get_category_counts, get_current_user, get_shop_list, list_products
+from ..models.buy import BuyerProd, OrderModel
+from ..models.product import ProductModel
+from ..shemas import user_pydantic
+
+"""
+Программный интерфейс (JSON) для чтения каталога, категорий, магазинов и заказов
+"""
+
+# Поля товара, доступные в ответе: поле ответа - поля таблицы товаров, необходимые для его вычисления
+PRODUCT_FIELDS = {
+    'id': ('id',),
+    'name': ('name',),
+    'description': ('description',),
+    'item_number': ('item_number',),
+    'price': ('price',),
+    'count': ('count',),
+    'is_active': ('is_active',),
+    'action': ('action',),
+    'category_id': ('category_id',),
+    'image_url': ('id', 'name', 'img'),
+}
+# Поля товара в ответе по умолчанию
+PRODUCT_DEFAULT_FIELDS = ('id', 'name', 'price', 'count', 'is_active', 'action', 'category_id', 'image_url')
+# Поля категории, доступные в ответе
+CATEGORY_FIELDS = ('id', 'name', 'parent', 'path', 'title', 'count')
+# Поля магазина, доступные в ответе
+SHOP_FIELDS = ('id', 'name', 'location')
+# Поля заказа, доступные в ответе
+ORDER_FIELDS = ('number', 'shop_id', 'created_at', 'status', 'total', 'products')
+# Максимальное количество элементов на странице
+MAX_PAGE_SIZE = 100
+
+
+api_router = APIRouter(prefix='/api/v1', tags=['api'], default_response_class=ORJSONResponse)
+
+
+def parse_fields(fields: str, allowed, default=None) -> tuple[str, ...]:
+    """
+    Разбор параметра fields: перечня полей ответа через запятую.
+    :param fields: Значение параметра fields.
+    :param allowed: Допустимые поля.
+    :param default: Поля по умолчанию, если параметр не задан. По умолчанию все допустимые поля.
+    :return: Поля ответа.
+    """
+    if fields == '':
+        return tuple(default or allowed)
+    result = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in result if field not in allowed]
+    if unknown or not result:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=f'Недопустимые поля: {", ".join(unknown)}')
+    return result
+
+
+def product_to_dict(product: ProductModel, fields: tuple[str, ...]) -> dict:
+    """
+    Преобразование товара в словарь с указанными полями.
+    :param product: Товар.
+    :param fields: Поля ответа.
+    :return: Словарь с данными товара.
+    """
+    return {field: image_url(product, 'list') if field == 'image_url' else getattr(product, field)
+            for field in fields}
+
+
+@api_router.get('/products')
+async def products_get(category: str = '', q: str = '', page: int = 0, size: int = 20, after: str = '',
+                       before: str = '', price_min: float | None = None, price_max: float | None = None,
+                       action: str = '', in_stock: str = '', is_active: str = '', sort: str = '', fields: str = ''):
+    """
+    Список товаров. Отбор и сортировка выполняются так же, как на странице списка товаров. Страницы задаются
+    номером (page) или токеном курсора (after, before).
+    :param category: Идентификатор категории, отбираются товары категории и её подкатегорий.
+    :param q: Строка поиска.
+    :param page: Номер страницы.
+    :param size: Количество товаров на странице.
+    :param after: Токен курсора следующей страницы.
+    :param before: Токен курсора предыдущей страницы.
+    :param price_min: Минимальная цена товара.
+    :param price_max: Максимальная цена товара.
+    :param action: Признак отбора товаров, участвующих в акции.
+    :param in_stock: Признак отбора товаров в наличии.
+    :param is_active: Признак отбора доступных товаров.
+    :param sort: Порядок сортировки: price, -price, name или new.
+    :param fields: Поля товара в ответе через запятую.
+    :return: Товары страницы и данные для навигации по страницам.
+    """
+    fields = parse_fields(fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    columns = tuple(dict.fromkeys(column for field in fields for column in PRODUCT_FIELDS[field]))
+    size = min(max(size, 1), MAX_PAGE_SIZE)
+    filters = {'price_min': price_min, 'price_max': price_max, 'action': action, 'in_stock': in_stock,
+               'is_active': is_active}
+    products, service = await list_products(('id', *columns), size, category, q, filters, sort, page,
+                                            after != '' or before != '', after, before)
+    service.pop('pages', None)
+    return ORJSONResponse({'items': [product_to_dict(product, fields) for product in products], 'service': service})
+
+
+@api_router.get('/products/{id_product}')
+async def product_get(id_product: int, fields: str = ''):
+    """
+    Данные товара.
+    :param id_product: Идентификатор товара.
+    :param fields: Поля товара в ответе через запятую.
+    :return: Данные товара.
+    """
+    fields = parse_fields(fields, PRODUCT_FIELDS)
+    columns = tuple(dict.fromkeys(column for field in fields for column in PRODUCT_FIELDS[field]))
+    product = await ProductModel.get_or_none(id=id_product).only('id', *columns)
+    if product is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='Товар не найден')
+    return ORJSONResponse(product_to_dict(product, fields))
+
+
+@api_router.get('/categories')
+async def categories_get(fields: str = ''):
+    """
+    Дерево категорий: список категорий с родительской категорией, путём от корня дерева, полным названием и
+    количеством доступных товаров вместе с подкатегориями.
+    :param fields: Поля категории в ответе через запятую.
+    :return: Список категорий.
+    """
+    fields = parse_fields(fields, CATEGORY_FIELDS)
+    tree = await get_category_tree()
+    counts = await get_category_counts() if 'count' in fields else {}
+    result = []
+    for category in tree.categories:
+        data = {'id': category.id, 'name': category.name, 'parent': category.parent, 'path': category.path,
+                'title': tree.path(category.id), 'count': counts.get(category.id, 0)}
+        result.append({field: data[field] for field in fields})
+    return ORJSONResponse(result)
+
+
+@api_router.get('/shops')
+async def shops_get(fields: str = ''):
+    """
+    Список доступных магазинов.
+    :param fields: Поля магазина в ответе через запятую.
+    :return: Список магазинов.
+    """
+    fields = parse_fields(fields, SHOP_FIELDS)
+    shops = await get_shop_list() or []
+    return ORJSONResponse([shop.model_dump(include=set(fields)) for shop in shops])
+
+
+@api_router.get('/orders/{user_id}')
+async def orders_get(user: Annotated[user_pydantic, Depends(get_current_user)], user_id: int, size: int = 20,
+                     after: str = '', before: str = '', fields: str = ''):
+    """
+    Заказы пользователя, начиная с последнего. Страницы задаются токеном курсора.
+    :param user: Текущий пользователь.
+    :param user_id: Идентификатор пользователя.
+    :param size: Количество заказов на странице.
+    :param after: Токен курсора следующей страницы.
+    :param before: Токен курсора предыдущей страницы.
+    :param fields: Поля заказа в ответе через запятую.
+    :return: Заказы страницы и данные для навигации по страницам.
+    """
+    if user is None:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail='Вы не авторизованы')
+    if not any((user.is_staff, user.admin)) and user.id != user_id:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail='У вас отсутствуют права')
+    fields = parse_fields(fields, ORDER_FIELDS)
+    size = min(max(size, 1), MAX_PAGE_SIZE)
+    headers, service = await pagination_cursor(OrderModel.filter(user_id=user_id), size, after, before,
+                                               descending=True)
+    orders = {header.id: {'number': header.id, 'shop_id': header.shop_id, 'created_at': header.created_at,
+                          'status': header.status, 'total': header.total, 'products': []} for header in headers}
+    if 'products' in fields:
+        rows = await BuyerProd.filter(order_id__in=list(orders)).order_by('id') \
+            .values('order_id', 'product_id', 'count', 'is_used')
+        for row in rows:
+            orders[row['order_id']]['products'].append({'product_id': row['product_id'], 'count': row['count'],
+                                                        'used': row['is_used']})
+    items = [{field: order[field] for field in fields} for order in orders.values()]
+    return ORJSONResponse({'items': items, 'service': service})
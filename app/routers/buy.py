@@ -1,69 +1,80 @@
-from tortoise.expressions import Q
-from tortoise.functions import Max
+from tortoise.transactions import in_transaction
 from fastapi import APIRouter, Depends, status, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from typing import Annotated
+from datetime import date, datetime, time, timedelta
 
-from ..backend.service.service import pagination
-from ..models.buy import BuyerProd
+from ..backend.service.service import pagination, pagination_cursor, pagination_queryset
+from ..backend.service.exporter import EXPORT_FORMATS, export_format, export_headers, export_rows
+from ..models.buy import BuyerProd, OrderModel, ORDER_PAID, ORDER_ISSUED
+from ..models.product import ProductModel
 from fastapi.templating import Jinja2Templates
 from ..depends import get_product, update_count_product, get_shop, get_shop_list, get_current_user, get_shop_model, \
-    get_product_model, get_user_model
+    get_user_model, get_category_tree, subtree_bound, get_cart, add_cart_item, remove_cart_item, \
+    clear_cart, next_order_number
 from ..models.shop import Shops
 from ..models.users import User
 from ..shemas import Car, Payment, user_pydantic
 
 
+# Поля строки заказа, выгружаемые в файл
+ORDER_EXPORT_FIELDS = ('id', 'id_operation', 'created_at', 'user_id', 'shop_id', 'product_id',
+                       'product__item_number', 'product__name', 'count', 'is_used')
+# Колонки файла выгрузки строк заказов
+ORDER_EXPORT_COLUMNS = ('id', 'id_operation', 'created_at', 'user_id', 'shop_id', 'product_id', 'item_number',
+                        'name', 'count', 'is_used')
+
 buy_router = APIRouter(prefix='/buy', tags=['buy'])
 templates = Jinja2Templates(directory='app/templates/buy/')
 
 
+def convert_order_line(row: dict) -> dict:
+    """
+    Преобразование строки заказа, выбранной из базы данных, в строку файла выгрузки.
+    :param row: Строка заказа.
+    :return: Строка файла выгрузки.
+    """
+    row['item_number'] = row.pop('product__item_number')
+    row['name'] = row.pop('product__name')
+    if row['created_at'] is not None:
+        row['created_at'] = row['created_at'].isoformat()
+    return row
+
+
 class Order:
     """
     Класс отображения заказа
     """
 
-    def __init__(self, number: int):
+    def __init__(self, number: int, header: OrderModel | None = None):
         """
         Инициализация элемента класс.
         :param number: Номер заказа.
+        :param header: Заказ (шапка заказа) с суммой, статусом и датой заказа.
         """
         self.shop = None
         self.number = number
         self.user = None
         self.data_prods = []
+        self.total = header.total if header is not None else None
+        self.status = header.status if header is not None else None
+        self.created_at = header.created_at if header is not None else None
 
     def __str__(self):
         return f'Заказ номер: {self.number}'
 
-    async def add_prods_by_db(self):
-        """
-        Добавление данных по товарам
-        """
-        order = await BuyerProd.filter(id_operation=self.number)
-        if self.shop is None:
-            self.shop = await order[0].shop
-        if self.user is None:
-            user = await order[0].user
-            self.user = user.id
-        for prod in order:
-            product = await prod.product
-            self.data_prods.append({'product': product, 'count': prod.count, 'used': prod.is_used})
-
-    async def add_prods_by_list(self, buy_prod_list: list):
+    def add_prods(self, lines: list[BuyerProd]):
         """
-        Добавление данных по товарам
-        :param buy_prod_list: Список заказанных товаров
+        Добавление данных по товарам заказа. Товар и магазин строк заказа должны быть выбраны вместе со строками
+        (select_related), поэтому добавление не выполняет запросов к базе данных.
+        :param lines: Строки заказа.
         """
         if self.shop is None:
-            self.shop = await buy_prod_list[0].shop
+            self.shop = lines[0].shop
         if self.user is None:
-            user = await buy_prod_list[0].user
-            self.user = user.id
-        for prod in buy_prod_list:
-            product = await prod.product
-            if prod.id_operation == self.number:
-                self.data_prods.append({'product': product, 'count': prod.count, 'used': prod.is_used})
+            self.user = lines[0].user_id
+        for line in lines:
+            self.data_prods.append({'product': line.product, 'count': line.count, 'used': line.is_used})
 
     def get_index_prod(self, prod_id: int):
         """
@@ -81,39 +92,26 @@ class Order:
         self.data_prods[index]['is_used'] = used
 
 
-async def get_orders_by_list(buy_prods_list: list):
+def get_orders_by_list(buy_prods_list: list[BuyerProd], headers: list[OrderModel] | None = None) -> list[Order]:
     """
-    Получение списка заказов по списку покупок
-    :param buy_prods_list: Список покупок
+    Получение списка заказов по списку покупок. Покупки группируются по номеру заказа за один проход, порядок
+    заказов соответствует порядку покупок.
+    :param buy_prods_list: Список покупок, выбранных вместе с товаром и магазином (select_related).
+    :param headers: Заказы (шапки заказов), из которых берутся сумма, статус и дата заказа
     :return: Список заказов
     """
+    headers = {header.id: header for header in headers or []}
+    lines = {}
+    for buy_prod in buy_prods_list:
+        lines.setdefault(buy_prod.id_operation, []).append(buy_prod)
     orders = []
-    orders_number = []
-    for buy_prods in buy_prods_list:
-        if buy_prods.id_operation not in orders_number:
-            order = Order(buy_prods.id_operation)
-            await order.add_prods_by_list(buy_prods_list)
-            orders.append(order)
-            orders_number.append(buy_prods.id_operation)
+    for number, order_lines in lines.items():
+        order = Order(number, headers.get(number))
+        order.add_prods(order_lines)
+        orders.append(order)
     return orders
 
 
-class CarView:
-    """
-    Класс представляющий товар в корзине пользователя
-    """
-    def __init__(self, number, id_prod, name, price, count):
-        self.number = number
-        self.id_prod = id_prod
-        self.name = name
-        self.price = price
-        self.count = count
-
-
-# корзины для покупки
-cars = {}
-
-
 @buy_router.get('/payment')
 async def payment_get(request: Request, user: Annotated[user_pydantic | None, Depends(get_current_user)],
                       shop: str = ''):
@@ -126,7 +124,7 @@ async def payment_get(request: Request, user: Annotated[user_pydantic | None, De
     """
     info = {'request': request, 'title': 'Оплата заказа'}
     cost = 0
-    car = cars[user.id]
+    car = await get_cart(user.id)
     info['car'] = car
     info['user'] = user
     for item in car:
@@ -150,19 +148,23 @@ async def payment_post(request: Request, user: Annotated[user_pydantic | None, D
     :return: Сообщение об оплате.
     """
     info = {'request': request, 'title': 'Спасибо за покупку'}
-    max_operation = \
-        (await BuyerProd.annotate(max_operation=Max("id_operation")).values_list("max_operation", flat=True))[0]
-    if max_operation is None:
-        max_operation = 1
-    else:
-        max_operation = max_operation + 1
     shop_sel = await get_shop_model(int(shop))
     user_buy = await get_user_model(user.id)
-    for item in cars[user.id]:
-        prod = await get_product_model(item.id_prod)
-        await BuyerProd.create(user=user_buy, product=prod, id_operation=max_operation, shop=shop_sel,
-                               count=item.count)
-    cars.pop(user.id)
+    async with in_transaction() as conn:
+        car = await get_cart(user.id)
+        if len(car) == 0:
+            info['title'] = 'Оплата заказа'
+            info['message'] = 'Корзина пуста'
+            return templates.TemplateResponse('payment.html', info)
+        max_operation = await next_order_number()
+        products = {product.id: product
+                    for product in await ProductModel.filter(id__in={item.id_prod for item in car}).only('id')}
+        order = await OrderModel.create(id=max_operation, user=user_buy, shop=shop_sel,
+                                        total=sum(item.price * item.count for item in car), using_db=conn)
+        lines = [BuyerProd(user=user_buy, product=products[item.id_prod], id_operation=max_operation, shop=shop_sel,
+                           count=item.count, order=order) for item in car if item.id_prod in products]
+        await BuyerProd.bulk_create(lines, using_db=conn)
+        await clear_cart(user.id, sold=[item.number for item in car])
     info['message'] = f'Заказ номер: {max_operation}'
     return templates.TemplateResponse('payment.html', info)
 
@@ -181,28 +183,24 @@ async def car_post(request: Request, user: Annotated[user_pydantic | None, Depen
     info = {'request': request, 'title': 'Корзина'}
     if user is None:
         return RedirectResponse(f'/user/login', status_code=status.HTTP_303_SEE_OTHER)
+    added = False
+    if car_user.count > 0:
+        async with in_transaction():
+            added = await update_count_product(id_product, -car_user.count)
+            if added:
+                await add_cart_item(user.id, id_product, car_user.count)
     product = await get_product(id_product)
     if product is None:
         return HTTPException(status.HTTP_404_NOT_FOUND, 'Товар не найден')
+    info['product'] = product
     if car_user.count < 1:
         info['message'] = 'Требуемое количество товара не может быть меньше 1'
     else:
         info['user'] = user
-        new_count = product.count - car_user.count
-        if new_count < 0:
+        if not added:
             info['buy'] = 1
             info['message'] = 'Не достаточно товара'
             info['count'] = product.count
-        else:
-            await update_count_product(id_product, -car_user.count)
-            product = await get_product(id_product)
-        info['product'] = product
-        if user.id not in cars.keys():
-            cars[user.id] = []
-
-        cars[user.id].append(CarView(len(cars[user.id]), product.id, product.name, product.price, car_user.count))
-
-        print(cars)
     return templates.TemplateResponse('car.html', info)
 
 
@@ -241,17 +239,13 @@ async def buy_get(request: Request, delet: int = -1, shop: str = '', user=Depend
     """
     info = {'request': request, 'title': 'Корзина'}
     cost = 0
-    if user.id not in cars.keys():
+    if delet > -1:
+        await remove_cart_item(user.id, delet)
+    car = await get_cart(user.id)
+    if len(car) == 0:
         info['message'] = 'Корзина пуста'
     else:
-        if delet > -1:
-            for i in range(len(cars[user.id])):
-                if cars[user.id][i].number == delet:
-                    await update_count_product(cars[user.id][i].id_prod, cars[user.id][i].count)
-                    cars[user.id].pop(i)
-                    break
         info['display'] = 1
-        car = cars[user.id]
         info['car'] = car
         info['user'] = user
         info['shops'] = await get_shop_list()
@@ -273,7 +267,7 @@ async def buy_post(request: Request, user: Annotated[user_pydantic | None, Depen
     """
     info = {'request': request, 'title': 'Корзина'}
     cost = 0
-    car = cars[user.id]
+    car = await get_cart(user.id)
     info['car'] = car
     info['user'] = user
     for item in car:
@@ -286,13 +280,53 @@ async def buy_post(request: Request, user: Annotated[user_pydantic | None, Depen
     return RedirectResponse(f'/buy/payment?shop={shop}', status_code=status.HTTP_303_SEE_OTHER)
 
 
+@buy_router.get('/export')
+async def export_orders_get(user: Annotated[user_pydantic, Depends(get_current_user)], file_format: str = 'csv',
+                            date_from: date | None = None, date_to: date | None = None, shop: int = -1,
+                            category: int = -1):
+    """
+    Выгрузка строк заказов в файл CSV или JSONL.
+    :param user: Текущий пользователь.
+    :param file_format: Формат файла: csv или jsonl.
+    :param date_from: Начальная дата покупки.
+    :param date_to: Конечная дата покупки (включительно).
+    :param shop: Идентификатор магазина.
+    :param category: Идентификатор категории товара, выгружаются товары категории и её подкатегорий.
+    :return: Файл выгрузки или переадресация, если пользователь не сотрудник.
+    """
+    if user is None or not user.is_staff:
+        return RedirectResponse('/main')
+    file_format = export_format(file_format)
+    queryset = BuyerProd.filter()
+    if date_from is not None:
+        queryset = queryset.filter(created_at__gte=datetime.combine(date_from, time.min))
+    if date_to is not None:
+        queryset = queryset.filter(created_at__lt=datetime.combine(date_to + timedelta(days=1), time.min))
+    if shop > -1:
+        queryset = queryset.filter(shop_id=shop)
+    if category > -1:
+        node = (await get_category_tree()).get(category)
+        if node is not None and node.path:
+            queryset = queryset.filter(product__category__path__gte=node.path,
+                                       product__category__path__lt=subtree_bound(node.path))
+        else:
+            queryset = queryset.filter(product__category_id=category)
+    rows = export_rows(queryset, ORDER_EXPORT_FIELDS, ORDER_EXPORT_COLUMNS, file_format, convert_order_line)
+    return StreamingResponse(rows, media_type=EXPORT_FORMATS[file_format][0],
+                             headers=export_headers('orders', file_format))
+
+
 @buy_router.get('/orders/{user_id}')
 async def orders_get(request: Request, user_id: int = -1, number: str = '',
-                     page: str = '', user=Depends(get_current_user)):
+                     page: str = '', cursor: str = '', after: str = '', before: str = '',
+                     user=Depends(get_current_user)):
     """
     Отображение страницы история заказов.
     :param number: Строка поиска
     :param page: Номер страницы списка заказов
+    :param cursor: Признак разбиения списка заказов на страницы по курсору
+    :param after: Токен курсора следующей страницы
+    :param before: Токен курсора предыдущей страницы
     :param request: Запрос.
     :param user_id: Идентификатор пользователя.
     :param user: Текущий пользователь.
@@ -308,12 +342,19 @@ async def orders_get(request: Request, user_id: int = -1, number: str = '',
     if not any((user.is_staff, user.admin)) and user.id != user_id:
         return RedirectResponse(f'/main', status_code=status.HTTP_303_SEE_OTHER)
     if number != '':
-        buy_prods = await BuyerProd.filter(Q(join_type=Q.AND, user=user_id, id_operation=number))
+        queryset = OrderModel.filter(user_id=user_id, id=int(number))
+    else:
+        queryset = OrderModel.filter(user_id=user_id)
+    use_cursor = cursor != '' or after != '' or before != ''
+    if use_cursor:
+        headers, service = await pagination_cursor(queryset, 4, after, before, descending=True)
     else:
-        buy_prods = await BuyerProd.filter(user_id=user_id).order_by("-id_operation")
-    if len(buy_prods) > 0:
-        orders = await get_orders_by_list(list(buy_prods))
-        info['orders'], info['service'] = pagination(orders, page, 4)
+        queryset, service = await pagination_queryset(queryset.order_by('-id'), page, 4)
+        headers = await queryset
+    if len(headers) > 0:
+        buy_prods = await BuyerProd.filter(order_id__in=[header.id for header in headers]) \
+            .select_related('product', 'shop').order_by('-order_id', 'id')
+        info['orders'], info['service'] = get_orders_by_list(buy_prods, headers), service
     else:
         info['empty'] = True
     return templates.TemplateResponse('order_list_page.html', info)
@@ -334,14 +375,15 @@ async def order_get(request: Request, number: int = -1, used: str = '',
     info = {'request': request, 'title': 'Описание заказа'}
     if prod > -1:
         res = used == '1'
-        await BuyerProd.filter(Q(join_type=Q.AND, id_operation=number, product=prod)).update(is_used=res)
-    buy_prods = await BuyerProd.filter(id_operation=number)
-    if buy_prods is None:
+        await BuyerProd.filter(order_id=number, product_id=prod).update(is_used=res)
+        issued = not await BuyerProd.filter(order_id=number, is_used=False).exists()
+        await OrderModel.filter(id=number).update(status=ORDER_ISSUED if issued else ORDER_PAID)
+    buy_prods = await BuyerProd.filter(order_id=number).select_related('product', 'shop').order_by('id')
+    if len(buy_prods) == 0:
         info['message'] = 'Заказ не найден'
         return templates.TemplateResponse('order_page.html', info)
     else:
-        order = Order(number)
-        await order.add_prods_by_db()
+        order = get_orders_by_list(buy_prods)[0]
         info['order'] = order
     if user is None:
         return RedirectResponse(f'/main', status_code=status.HTTP_303_SEE_OTHER)
@@ -374,9 +416,10 @@ async def orders_get(request: Request, number: str = '',
         return RedirectResponse(f'/main', status_code=status.HTTP_303_SEE_OTHER)
     if number != '':
         number = int(number)
-        buy_prods = await BuyerProd.filter(id_operation=number)
-        if buy_prods is not None:
-            orders = await get_orders_by_list(list(buy_prods))
+        headers = await OrderModel.filter(id=number)
+        buy_prods = await BuyerProd.filter(order_id=number).select_related('product', 'shop').order_by('id')
+        if len(buy_prods) > 0:
+            orders = get_orders_by_list(buy_prods, headers)
             info['orders'], info['service'] = pagination(orders, page, 4)
         else:
             info['empty'] = True
@@ -2,11 +2,12 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, status, HTTPException, Request
 from fastapi.responses import RedirectResponse
-from tortoise.fields.relational import _NoneAwaitable
 from ..models.category import Categories
 from fastapi.templating import Jinja2Templates
-from ..depends import get_categories_subgroups, get_category, get_current_user, check_use_category
-from ..shemas import category_pydantic, user_pydantic
+from ..depends import get_category_tree, get_current_user, check_use_category, category_created, \
+    category_moved, category_deleted, create_category, move_category, \
+    invalidate_category_counts
+from ..shemas import user_pydantic
 
 category_router = APIRouter(prefix='/category', tags=['category'])
 templates = Jinja2Templates(directory='app/templates/category/')
@@ -29,9 +30,7 @@ async def list_categories_get(request: Request, user: Annotated[user_pydantic |
         info['message'] = 'У вас нет прав'
     else:
         info['display'] = 'Ok'
-        categories = await Categories.all()
-        if categories is not None:
-            info['categories'] = categories
+        info['categories'] = (await get_category_tree()).categories
     return templates.TemplateResponse('categories_list.html', info)
 
 
@@ -54,16 +53,24 @@ async def update_category_get(request: Request, user: Annotated[user_pydantic |
         info['message'] = 'У вас нет прав'
     elif parent == '':
         info['display'] = 'Ok'
-        categories = await category_pydantic.from_queryset(Categories.all())
-        category = get_category(categories, id_category)
+        tree = await get_category_tree()
+        category = tree.get(id_category)
         if category is None:
             return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Категория не найдена')
         info['category'] = category
         info['id_category'] = category.id
-        info['categories'] = categories
+        info['categories'] = tree.categories
     else:
         info['display'] = 'Ok'
-        await Categories.filter(id=id_category).update(parent=int(parent))
+        if not await move_category(id_category, int(parent)):
+            tree = await get_category_tree()
+            info['message'] = 'Родительской категорией не может быть сама категория или её подкатегория'
+            info['category'] = tree.get(id_category)
+            info['id_category'] = id_category
+            info['categories'] = tree.categories
+            return templates.TemplateResponse('category_update.html', info)
+        category_moved(id_category, int(parent))
+        invalidate_category_counts()
         info['message'] = 'Обновлено'
         return RedirectResponse(f'/category/{id_category}',
                                 status_code=status.HTTP_303_SEE_OTHER)
@@ -91,15 +98,14 @@ async def add_category_get(request: Request, user: Annotated[user_pydantic | Non
     else:
         info['display'] = 'Ok'
         if name == '' and parent == '':
-            categories = await category_pydantic.from_queryset(Categories.all())
-            if categories is not None:
-                info['categories'] = categories
+            info['categories'] = (await get_category_tree()).categories
         elif name == '':
             info['message'] = 'Поле название не может быть пустым'
         elif parent == '':
             info['message'] = 'Поле родительская категория не может быть пустым'
         else:
-            await Categories.create(name=name, parent=int(parent))
+            category = await create_category(name, int(parent))
+            category_created(category)
             return RedirectResponse('/category/list')
     return templates.TemplateResponse('category_create.html', info)
 
@@ -125,11 +131,13 @@ async def delete_category_get(request: Request, user: Annotated[user_pydantic |
     else:
         info['display'] = 'Ok'
         info['id_category'] = id_category
-        categories = await Categories.all()
-        category = get_category(categories, id_category)
+        tree = await get_category_tree()
+        category = tree.get(id_category)
+        if category is None:
+            return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Категория не найдена')
         use_category = await check_use_category(id_category)
         info['name'] = category.name
-        children = get_categories_subgroups(categories, id_category)
+        children = tree.subgroups(id_category)
         if len(children) > 0:
             info['message'] = 'Удаление запрещено. Имеются связанные категории'
             info['children'] = children
@@ -160,6 +168,7 @@ async def delete_category_post(request: Request, user: Annotated[user_pydantic |
     else:
         info['display'] = 'Ok'
         await Categories.filter(id=id_category).delete()
+        category_deleted(id_category)
         return RedirectResponse('/list', status_code=status.HTTP_303_SEE_OTHER)
     return templates.TemplateResponse('category_delete.html', info)
 
@@ -184,15 +193,12 @@ async def category_get(request: Request, user: Annotated[user_pydantic | None, D
         info['message'] = 'У вас нет прав'
     else:
         info['display'] = 'Ok'
-        categories = await Categories.all()
-        category = await Categories.filter(id=id_category).first()
-        if isinstance(category, _NoneAwaitable):
+        tree = await get_category_tree()
+        category = tree.get(id_category)
+        if category is None:
             return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Категория не найдена')
-        if isinstance(category.parent, _NoneAwaitable):
-            pass
-        else:
-            info['parent'] = get_category(categories, category.parent)
+        info['parent'] = tree.get(category.parent)
         info['category'] = category
-        info['children'] = get_categories_subgroups(categories, id_category)
-        info['categories'] = categories
+        info['children'] = tree.subgroups(id_category)
+        info['categories'] = tree.categories
     return templates.TemplateResponse('category.html', info)
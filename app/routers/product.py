@@ -1,32 +1,53 @@
-from tortoise.expressions import Q
 from fastapi import File, UploadFile, APIRouter, Depends, status, HTTPException, Request, Form
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from typing import Annotated
 from fastapi.templating import Jinja2Templates
-import os
-from PIL import Image
+from urllib.parse import urlencode
+from PIL import UnidentifiedImageError
 from ..models.product import ProductModel
-from ..depends import check_use_product, get_categories, get_category, find_category, get_current_user, \
-    get_category_model
-from ..backend.service.service import pagination, image_to_str
-from ..shemas import product_pydantic, user_pydantic
+from ..depends import check_use_product, get_categories, get_category_tree, get_current_user, get_category_model, \
+    get_category_counts, invalidate_category_counts, bulk_update_products, list_products, \
+    select_products, filter_products, parse_price
+from ..backend.service.service import image_url, image_response
+from ..backend.service.images import VARIANTS, store_upload, get_variant, is_digest, image_path, \
+    content_path
+from ..backend.service.importer import IMPORT_FIELDS, import_products, file_format_by_name
+from ..backend.service.exporter import EXPORT_FORMATS, export_format, export_headers, export_rows
+from ..shemas import product_pydantic, user_pydantic, ProductChange
 
 product_router = APIRouter(prefix='/product', tags=['product'])
 templates = Jinja2Templates(directory='app/templates/product/')
 
 
+# Поля товара, выводимые в списке товаров
+PRODUCT_LIST_FIELDS = ('id', 'name', 'price', 'img', 'is_active', 'count')
+# Поля товара, выгружаемые в файл
+PRODUCT_EXPORT_FIELDS = ('id', 'item_number', 'name', 'description', 'price', 'count', 'category_id', 'is_active',
+                         'action', 'img')
 # Обработка таблицы Product
 @product_router.get('/list')
 async def select_products_list_get(request: Request, user: Annotated[user_pydantic, Depends(get_current_user)],
-                                   category: str = '', q: str = '', page: str = ''):
+                                   category: str = '', q: str = '', page: str = '', cursor: str = '',
+                                   after: str = '', before: str = '', price_min: str = '', price_max: str = '',
+                                   action: str = '', in_stock: str = '', is_active: str = '', sort: str = ''):
     """
-    Просмотр списка товаров. Список товаров может быть ограничен выбранной категорией, совпадением названия или
-    описания со строкой поиска.
+    Просмотр списка товаров. Список товаров может быть ограничен выбранной категорией вместе с её подкатегориями,
+    совпадением названия или описания со строкой поиска, диапазоном цены, участием в акции, наличием и
+    доступностью товара. Отбор и сортировка выполняются в базе данных.
     :param request: Запрос.
     :param user: Текущий пользователь
     :param category: Идентификатор категории
     :param q: строка поиска
     :param page: номер страницы списка товаров
+    :param cursor: признак разбиения списка на страницы по курсору
+    :param after: токен курсора следующей страницы
+    :param before: токен курсора предыдущей страницы
+    :param price_min: минимальная цена товара
+    :param price_max: максимальная цена товара
+    :param action: признак отбора товаров, участвующих в акции
+    :param in_stock: признак отбора товаров в наличии
+    :param is_active: признак отбора доступных товаров
+    :param sort: порядок сортировки: price, -price, name или new
     :return: Страница списка товаров.
     """
     info = {'request': request, 'title': 'Список товаров'}
@@ -38,21 +59,21 @@ async def select_products_list_get(request: Request, user: Annotated[user_pydant
         pass
     elif user.is_staff:
         info['is_staff'] = 'Ok'
-    if q != '':
-        querty = Q(join_type=Q.OR, name__icontains=q, description__icontains=q)
-        products = await product_pydantic.from_queryset(ProductModel.filter(querty).all())
-    elif category != '':
-        products = await product_pydantic.from_queryset(ProductModel.filter(category=int(category)).all())
-    else:
-        products = await product_pydantic.from_queryset(ProductModel.filter().all())
+    filters = {'price_min': parse_price(price_min), 'price_max': parse_price(price_max), 'action': action,
+               'in_stock': in_stock, 'is_active': is_active}
+    products, service = await list_products(PRODUCT_LIST_FIELDS, 6, category, q, filters, sort, page,
+                                            cursor != '' or after != '' or before != '', after, before)
     if len(products) > 0:
         product_list = []
         for product in products:
-            image_str, format_file = image_to_str(product, 'list')
-            product_list.append({'name': product.name, 'price': product.price, 'id': product.id, 'image_str': image_str,
-                                 'format_file': format_file, 'is_active': product.is_active, 'count': product.count})
-        info['products'], info['service'] = pagination(product_list, page, 6)
+            product_list.append({'name': product.name, 'price': product.price, 'id': product.id,
+                                 'image_url': image_url(product, 'list'), 'is_active': product.is_active,
+                                 'count': product.count})
+        info['products'], info['service'] = product_list, service
+        info['query'] = urlencode({key: value for key, value in (('q', q), ('category', category), *filters.items(),
+                                                                 ('sort', sort)) if value not in (None, '')})
         info['categories'] = await get_categories()
+        info['category_counts'] = await get_category_counts()
     return templates.TemplateResponse('product_list_page.html', info)
 
 
@@ -86,29 +107,116 @@ async def create_product_post(request: Request,
         if name == '':
             info['message'] = 'Поле имя не может быть пустым'
         try:
-            if not os.path.exists("./app/templates/product/image/" + name):
-                os.mkdir("./app/templates/product/image/" + name)
-
-            contents = file.file.read()
-            file_name = file.filename
-            with open("./app/templates/product/image/" + name + '/' + file_name, "wb") as f:
-                f.write(contents)
+            digest = await store_upload(file)
+        except HTTPException:
+            raise
         except Exception:
             raise HTTPException(status_code=500, detail='Something went wrong')
         finally:
-            file.file.close()
-        image = Image.open("./app/templates/product/image/" + name + '/' + file_name)
-        image.thumbnail(size=(100, 100))
-        image.save("./app/templates/product/image/" + name + '/small_' + file_name)
+            await file.close()
         cat = await get_category_model(int(category))
         await ProductModel.create(name=name, description=description,
                                   price=price, count=count,
                                   category=cat, item_number=item_number,
-                                  img=file_name)
+                                  img=digest)
+        invalidate_category_counts()
         return RedirectResponse('/product/list', status_code=status.HTTP_303_SEE_OTHER)
     return templates.TemplateResponse('add_product_page.html', info)
 
 
+@product_router.post('/import')
+async def import_product_post(request: Request, user: Annotated[user_pydantic, Depends(get_current_user)],
+                              file: UploadFile = File(...)):
+    """
+    Загрузка товаров из файла CSV или JSONL. Товары с имеющимся артикулом обновляются, остальные добавляются.
+    :param request: Запрос.
+    :param user: Текущий пользователь.
+    :param file: Файл с товарами.
+    :return: Страница загрузки товаров с отчётом о загрузке.
+    """
+    info = {'request': request, 'title': 'Загрузка товаров'}
+    if user is None:
+        return RedirectResponse('/user/login', status_code=status.HTTP_303_SEE_OTHER)
+    elif not user.is_staff:
+        return RedirectResponse('/product/list', status_code=status.HTTP_303_SEE_OTHER)
+    info['display'] = 'Ok'
+    try:
+        report = await import_products(file.file, file_format_by_name(file.filename))
+    finally:
+        await file.close()
+    info['message'] = str(report)
+    info['errors'] = report.errors
+    return templates.TemplateResponse('import_product_page.html', info)
+
+
+@product_router.get('/import')
+async def import_product_get(request: Request, user: Annotated[user_pydantic, Depends(get_current_user)]):
+    """
+    Отображение страницы загрузки товаров из файла.
+    :param request: Запрос.
+    :param user: Текущий пользователь.
+    :return: Страница загрузки товаров.
+    """
+    info = {'request': request, 'title': 'Загрузка товаров'}
+    if user is None:
+        info['message'] = 'Вы не авторизованы. Пройдите авторизацию.'
+    elif not user.is_staff:
+        info['message'] = 'У вас нет прав'
+    else:
+        info['display'] = 'Ok'
+    return templates.TemplateResponse('import_product_page.html', info)
+
+
+@product_router.post('/bulk_update')
+async def bulk_update_product_post(user: Annotated[user_pydantic, Depends(get_current_user)],
+                                   changes: list[ProductChange]):
+    """
+    Изменение цены, количества и доступности списка товаров одной операцией.
+    :param user: Текущий пользователь.
+    :param changes: Список изменений: идентификатор или артикул товара, цена, изменение количества, доступность.
+    :return: Итоги изменения.
+    """
+    if user is None:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail='Вы не авторизованы')
+    if not user.is_staff:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail='У вас нет прав')
+    return await bulk_update_products(changes)
+
+
+@product_router.get('/export')
+async def export_product_get(user: Annotated[user_pydantic, Depends(get_current_user)], file_format: str = 'csv',
+                             category: str = '', price_min: str = '', price_max: str = '', action: str = '',
+                             in_stock: str = '', is_active: str = ''):
+    """
+    Выгрузка товаров в файл CSV или JSONL. Колонки файла совпадают с колонками загрузки товаров, категория
+    выгружается полным названием.
+    :param user: Текущий пользователь.
+    :param file_format: Формат файла: csv или jsonl.
+    :param category: Идентификатор категории, выгружаются товары категории и её подкатегорий.
+    :param price_min: Минимальная цена товара.
+    :param price_max: Максимальная цена товара.
+    :param action: Признак отбора товаров, участвующих в акции.
+    :param in_stock: Признак отбора товаров в наличии.
+    :param is_active: Признак отбора доступных товаров.
+    :return: Файл выгрузки или переадресация, если пользователь не сотрудник.
+    """
+    if user is None or not user.is_staff:
+        return RedirectResponse('/product/list')
+    file_format = export_format(file_format)
+    queryset = filter_products(await select_products(category), price_min=parse_price(price_min),
+                               price_max=parse_price(price_max), action=action, in_stock=in_stock,
+                               is_active=is_active)
+    tree = await get_category_tree()
+
+    def convert(row: dict) -> dict:
+        row['category'] = tree.path(row['category_id'])
+        return row
+
+    rows = export_rows(queryset, PRODUCT_EXPORT_FIELDS, ('id', 'item_number', *IMPORT_FIELDS), file_format, convert)
+    return StreamingResponse(rows, media_type=EXPORT_FORMATS[file_format][0],
+                             headers=export_headers('products', file_format))
+
+
 @product_router.get('/create')
 async def create_product_get(request: Request,
                              user: Annotated[user_pydantic, Depends(get_current_user)]):
@@ -154,6 +262,7 @@ async def update_product_post(request: Request, user: Annotated[user_pydantic, D
         await ProductModel.filter(id=id_product).update(description=description, price=price, count=count,
                                                         is_active=is_active == 'Да', category=cat,
                                                         item_number=item_number)
+        invalidate_category_counts()
         return RedirectResponse(f'/product/{id_product}', status_code=status.HTTP_303_SEE_OTHER)
     return RedirectResponse(f'/product/{id_product}')
 
@@ -179,7 +288,7 @@ async def update_product_get(request: Request, user: Annotated[user_pydantic, De
         info['categories'] = await get_categories()
         info['product'] = product
         info['display'] = 'Ok'
-        info['image_str'], info['format_file'] = image_to_str(product, 'page')
+        info['image_url'] = image_url(product, 'page')
         return templates.TemplateResponse('update_product_page.html', info)
 
 
@@ -195,26 +304,15 @@ async def update_image_product_post(request: Request, user: Annotated[user_pydan
     :return: Страница с отображением данных о товаре.
     """
     if user is not None and user.is_staff:
-        product = await ProductModel.get_or_none(id=id_product)
         try:
-            if not os.path.exists("./app/templates/product/image/" + product.name):
-                os.mkdir("./app/templates/product/image/" + product.name)
-            else:
-                os.remove("./app/templates/product/image/" + product.name + '/' + product.img)
-                os.remove("./app/templates/product/image/" + product.name + '/small_' + product.img)
-
-            contents = file.file.read()
-            file_name = file.filename
-            with open("./app/templates/product/image/" + product.name + '/' + file_name, "wb") as f:
-                f.write(contents)
+            digest = await store_upload(file)
+        except HTTPException:
+            raise
         except Exception:
             raise HTTPException(status_code=500, detail='Something went wrong')
         finally:
-            file.file.close()
-        image = Image.open("./app/templates/product/image/" + product.name + '/' + file_name)
-        image.thumbnail(size=(100, 100))
-        image.save("./app/templates/product/image/" + product.name + '/small_' + file_name)
-        await ProductModel.filter(id=id_product).update(img=file_name)
+            await file.close()
+        await ProductModel.filter(id=id_product).update(img=digest)
         return RedirectResponse(f'/product/{id_product}', status_code=status.HTTP_303_SEE_OTHER)
     return RedirectResponse(f'/product/{id_product}')
 
@@ -239,7 +337,7 @@ async def update_image_product_get(request: Request, user: Annotated[user_pydant
         info['categories'] = await get_categories()
         info['product'] = product
         info['display'] = 'Ok'
-        info['image_str'], info['format_file'] = image_to_str(product, 'page')
+        info['image_url'] = image_url(product, 'page')
         return templates.TemplateResponse('update_image_product_page.html', info)
 
 
@@ -260,6 +358,7 @@ async def delete_product_post(request: Request, user: Annotated[user_pydantic, D
         return RedirectResponse('/user/login')
     elif user.is_staff:
         await ProductModel.filter(id=id_product).update(is_active=False)
+        invalidate_category_counts()
     return RedirectResponse(f'/product/list', status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -285,14 +384,63 @@ async def delete_product_get(request: Request, user: Annotated[user_pydantic, De
         product_use = await check_use_product(id_product)
         if product_use:
             info['message'] = 'Товар уже покупали. Для удаления нужны права администратора'
-        categories = await get_categories()
-        info['category'] = find_category(categories, product.category)
+        tree = await get_category_tree()
+        info['category'] = tree.path(product.category_id)
         info['product'] = product
         info['display'] = 'Ok'
-        info['image_str'], info['format_file'] = image_to_str(product, 'page')
+        info['image_url'] = image_url(product, 'page')
         return templates.TemplateResponse('delete_product_page.html', info)
 
 
+@product_router.get('/image/content/{digest}/{key}')
+async def content_image_get(request: Request, digest: str, key: str = 'page'):
+    """
+    Изображение товара из хранилища по хэшу содержимого. Содержимое по адресу никогда не меняется, поэтому
+    изображение кэшируется браузером как неизменяемое. Формат выбирается по заголовку Accept: WebP, если браузер
+    его поддерживает, иначе JPEG.
+    :param request: Запрос.
+    :param digest: Хэш содержимого изображения.
+    :param key: Вариант изображения: list, page, zoom или lqip.
+    :return: Файл изображения или ответ 304 если у браузера актуальная копия.
+    """
+    if not is_digest(digest) or key not in VARIANTS:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='Изображение отсутствует')
+    image_format = 'webp' if 'image/webp' in request.headers.get('accept', '') else 'jpeg'
+    try:
+        file_path = await get_variant(content_path(digest), key, image_format)
+    except (OSError, UnidentifiedImageError):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='Изображение отсутствует')
+    response = image_response(request, file_path, immutable=True)
+    response.headers['vary'] = 'Accept'
+    return response
+
+
+@product_router.get('/image/{id_product}/{key}')
+async def product_image_get(request: Request, id_product: int = -1, key: str = 'page'):
+    """
+    Изображение товара, сохранённое по имени товара и имени файла (до переноса в хранилище по хэшу содержимого).
+    Вариант изображения нужного размера создаётся при первом запросе, формат выбирается по
+    заголовку Accept: WebP, если браузер его поддерживает, иначе JPEG. Файл передаётся с заголовками для
+    кэширования браузером.
+    :param request: Запрос.
+    :param id_product: Идентификатор товара.
+    :param key: Вариант изображения: list - карточка в списке товаров, page - страница товара,
+    zoom - увеличенное изображение, lqip - заполнитель на время загрузки.
+    :return: Файл изображения или ответ 304 если у браузера актуальная копия.
+    """
+    product = await ProductModel.get_or_none(id=id_product)
+    if product is None or key not in VARIANTS:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='Изображение отсутствует')
+    image_format = 'webp' if 'image/webp' in request.headers.get('accept', '') else 'jpeg'
+    try:
+        file_path = await get_variant(image_path(product), key, image_format)
+    except (OSError, UnidentifiedImageError):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail='Изображение отсутствует')
+    response = image_response(request, file_path)
+    response.headers['vary'] = 'Accept'
+    return response
+
+
 @product_router.get('/{id_product}')
 async def select_product_get(request: Request, user: Annotated[user_pydantic, Depends(get_current_user)],
                              id_product: str = '-1'):
@@ -306,10 +454,12 @@ async def select_product_get(request: Request, user: Annotated[user_pydantic, De
     info = {'request': request, 'title': 'Описание товара'}
     product = await ProductModel.get_or_none(id=id_product)
     if product:
-        categories = await get_categories()
-        info['product_category'] = find_category(categories, product.category)
+        tree = await get_category_tree()
+        info['product_category'] = tree.path(product.category_id)
         info['product'] = product
-        info['image_str'], info['format_file'] = image_to_str(product, 'page')
+        info['image_url'] = image_url(product, 'page')
+        info['zoom_url'] = image_url(product, 'zoom')
+        info['lqip_url'] = image_url(product, 'lqip')
         if user is not None:
             info['user'] = user
     else:
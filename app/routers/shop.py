@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends, status, Request, Form
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from ..models.shop import Shops
-from ..depends import get_current_user
+from ..depends import get_current_user, invalidate_shops
 from ..shemas import Shop, user_pydantic
 
 shop_router = APIRouter(prefix='/shop', tags=['shop'])
@@ -51,6 +51,7 @@ async def create_shop_post(request: Request, user: Annotated[user_pydantic | Non
     else:
         info['display'] = 'Ok'
         await Shops.create(name=shop.name, location=shop.location)
+        invalidate_shops()
         return RedirectResponse('/shop/list', status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -102,6 +103,7 @@ async def update_shop_post(request: Request, user: Annotated[user_pydantic | Non
     else:
         info['display'] = 'Ok'
         await Shops.filter(id=shop_id).update(name=shop.name, location=shop.location)
+        invalidate_shops()
         return RedirectResponse('/shop/list', status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -151,6 +153,7 @@ async def delete_shop_post(request: Request, user: Annotated[user_pydantic | Non
     else:
         info['display'] = 'Ok'
         await Shops.filter(id=shop_id).update(is_active=False)
+        invalidate_shops()
         return RedirectResponse('/shop/list', status_code=status.HTTP_303_SEE_OTHER)
 
 
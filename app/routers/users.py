@@ -6,8 +6,7 @@ from fastapi.templating import Jinja2Templates
 from app.shemas import CreateUser, SelectUser, UpdateUser, AdminUser, RepairPassword, CreatePassword, user_pydantic
 from datetime import datetime
 from .auth import get_password_hash, create_access_token, verify_password
-from ..depends import get_current_user, find_user_by_id
-from ..routers.buy import cars
+from ..depends import get_current_user, find_user_by_id, clear_cart
 
 user_router = APIRouter(prefix='/user', tags=['user'])
 templates = Jinja2Templates(directory='app/templates/users')
@@ -234,8 +233,7 @@ async def delete_user_self(request: Request,
     info = {'request': request, 'title': 'Удаление пользователя'}
     if user is None:
         return RedirectResponse('/main', status_code=303)
-    if user.id in cars.keys():
-        cars.pop(user.id)
+    await clear_cart(user.id)
     await User.filter(id=user.id).update(is_active=False, updated_at=datetime.now())
     response = RedirectResponse(f'/main', status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie(key="users_access_token")
@@ -390,8 +388,7 @@ async def delete_user_admin_post(request: Request,
     if user is None:
         return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Пользователь не найден')
     else:
-        if user.id in cars.keys():
-            cars.pop(user.id)
+        await clear_cart(user.id)
         await User.filter(id=user.id).delete()
         return RedirectResponse('user/list', status_code=status.HTTP_303_SEE_OTHER)
 
@@ -499,6 +496,6 @@ async def select_list_user_get(request: Request,
     elif user.admin is False:
         return HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                              detail='У вас отсутствуют права')
-    users = await User.all()
+    users = await User.all().order_by('id').values('id', 'username')
     info['users'] = users
     return templates.TemplateResponse("users_list.html", info)
\ No newline at end of file
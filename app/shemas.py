@@ -63,6 +63,19 @@ class Product(BaseModel):
     is_active: bool
 
 
+class ProductChange(BaseModel):
+    # идентификатор товара
+    id: int | None = None
+    # артикул товара, используется, если не указан идентификатор
+    item_number: str | None = None
+    # новая цена товара
+    price: float | None = None
+    # изменение количества товара: + увеличение, - уменьшение
+    count_delta: int | None = None
+    # новый статус доступности товара
+    is_active: bool | None = None
+
+
 class Car(BaseModel):
     count: int
 
@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "categories" ADD "path" VARCHAR(1024) NOT NULL  DEFAULT '';
+        CREATE INDEX "idx_categories_path_a87874" ON "categories" ("path");
+        WITH RECURSIVE "tree"("id", "path") AS (
+            SELECT "id", '/' || "id" || '/' FROM "categories"
+            WHERE "parent" NOT IN (SELECT "id" FROM "categories")
+            UNION ALL
+            SELECT "categories"."id", "tree"."path" || "categories"."id" || '/'
+            FROM "categories" JOIN "tree" ON "categories"."parent" = "tree"."id"
+        )
+        UPDATE "categories" SET "path" = COALESCE(
+            (SELECT "path" FROM "tree" WHERE "tree"."id" = "categories"."id"), '/' || "id" || '/');"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_categories_path_a87874";
+        ALTER TABLE "categories" DROP COLUMN "path";"""
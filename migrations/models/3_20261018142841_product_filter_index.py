@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX "idx_products_categor_d8ae94" ON "products" ("category_id", "is_active", "price");
+        CREATE INDEX "idx_products_is_acti_140d64" ON "products" ("is_active", "price");
+        CREATE INDEX "idx_products_is_acti_1a1949" ON "products" ("is_active", "name");
+        CREATE INDEX IF NOT EXISTS "idx_products_in_stock_price" ON "products" ("price") WHERE "is_active" = 1 AND "count" > 0;
+        CREATE INDEX IF NOT EXISTS "idx_products_action_price" ON "products" ("price") WHERE "action" = 1;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_products_action_price";
+        DROP INDEX IF EXISTS "idx_products_in_stock_price";
+        DROP INDEX IF EXISTS "idx_products_is_acti_1a1949";
+        DROP INDEX IF EXISTS "idx_products_is_acti_140d64";
+        DROP INDEX IF EXISTS "idx_products_categor_d8ae94";"""
@@ -0,0 +1,24 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "carts" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "user_id" INT NOT NULL UNIQUE REFERENCES "users" ("id") ON DELETE CASCADE
+) /* Класс - описание корзины пользователя */;
+        CREATE TABLE IF NOT EXISTS "cart_items" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "count" INT NOT NULL,
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "cart_id" INT NOT NULL REFERENCES "carts" ("id") ON DELETE CASCADE,
+    "product_id" INT NOT NULL REFERENCES "products" ("id") ON DELETE CASCADE
+) /* Класс - описание товара в корзине пользователя. Количество товара в корзине списано с остатка товара. */;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "cart_items";
+        DROP TABLE IF EXISTS "carts";"""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "cart_items" ADD "expires_at" TIMESTAMP;
+        UPDATE "cart_items" SET "expires_at" = "created_at";
+        CREATE INDEX "idx_cart_items_expires_9e29cb" ON "cart_items" ("expires_at");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_cart_items_expires_9e29cb";
+        ALTER TABLE "cart_items" DROP COLUMN "expires_at";"""
@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "sequences" (
+    "name" VARCHAR(64) NOT NULL  PRIMARY KEY,
+    "value" INT NOT NULL  DEFAULT 0
+) /* Класс - счётчик номеров: последний выданный номер последовательности */;
+        INSERT INTO "sequences" ("name", "value") SELECT 'order', COALESCE(MAX("id_operation"), 0) FROM "buyer";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "sequences";"""
@@ -0,0 +1,29 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "orders" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "status" VARCHAR(16) NOT NULL  DEFAULT 'paid',
+    "total" REAL NOT NULL  DEFAULT 0,
+    "shop_id" INT NOT NULL REFERENCES "shops" ("id") ON DELETE CASCADE,
+    "user_id" INT NOT NULL REFERENCES "users" ("id") ON DELETE CASCADE
+) /* Класс - описание заказа: покупатель, магазин, статус и сумма заказа. Идентификатор является номером заказа. */;
+CREATE INDEX IF NOT EXISTS "idx_orders_user_id_ef1190" ON "orders" ("user_id", "id");
+        ALTER TABLE "buyer" ADD "order_id" INT REFERENCES "orders" ("id") ON DELETE CASCADE;
+        INSERT INTO "orders" ("id", "user_id", "shop_id", "created_at", "status", "total")
+            SELECT "b"."id_operation", MIN("b"."user_id"), MIN("b"."shop_id"),
+                   COALESCE(MIN("b"."created_at"), CURRENT_TIMESTAMP),
+                   CASE WHEN MIN("b"."is_used") = 1 THEN 'issued' ELSE 'paid' END,
+                   SUM("b"."count" * "p"."price")
+            FROM "buyer" "b" JOIN "products" "p" ON "p"."id" = "b"."product_id"
+            GROUP BY "b"."id_operation";
+        UPDATE "buyer" SET "order_id" = "id_operation";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "buyer" DROP COLUMN "order_id";
+        DROP TABLE IF EXISTS "orders";"""
@@ -0,0 +1,119 @@
+import datetime
+import logging
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Шаблоны и статические файлы приложения подключаются по путям относительно корня проекта
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+
+from app.backend.db.db import tortoise_orm  # noqa: E402
+from app.backend.service.cache import caches  # noqa: E402
+from app.main import api  # noqa: E402
+from app.routers.auth import create_access_token, get_password_hash  # noqa: E402
+
+"""
+Общие фикстуры тестов: приложение с отдельной базой данных SQLite и журнал выполненных запросов SQL
+"""
+
+
+class QueryLog(logging.Handler):
+    """
+    Класс - журнал запросов SQL, выполненных TortoiseORM
+    """
+
+    def __init__(self):
+        """
+        Инициализация журнала.
+        """
+        super().__init__(logging.DEBUG)
+        self.queries = []
+
+    def emit(self, record: logging.LogRecord):
+        self.queries.append(record.getMessage())
+
+    def clear(self):
+        """
+        Очистка журнала.
+        """
+        self.queries.clear()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Приложение с пустой базой данных во временном каталоге. Кэши справочников очищаются, чтобы тест не получал
+    данные базы данных предыдущего теста.
+    """
+    monkeypatch.setitem(tortoise_orm['connections'], 'default', f'sqlite://{tmp_path / "test.db"}')
+    for cache in caches.values():
+        cache.invalidate()
+    with TestClient(api) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def query_log():
+    """
+    Журнал запросов SQL, выполненных за время теста.
+    """
+    logger = logging.getLogger('tortoise.db_client')
+    handler, level = QueryLog(), logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    yield handler
+    logger.removeHandler(handler)
+    logger.setLevel(level)
+
+
+@pytest.fixture
+def users(client):
+    """
+    Пользователи: администратор и покупатель.
+    """
+    from app.models.users import User
+
+    async def create():
+        admin = await User.create(username='admin', email='admin@example.com', day_birth=datetime.date(2000, 1, 1),
+                                  password=get_password_hash('admin'), is_staff=True, admin=True)
+        buyer = await User.create(username='buyer', email='buyer@example.com', day_birth=datetime.date(2000, 1, 1),
+                                  password=get_password_hash('buyer'))
+        return admin, buyer
+
+    return client.portal.call(create)
+
+
+@pytest.fixture
+def catalog(client):
+    """
+    Каталог: категория с подкатегорией, товары обеих категорий и магазин.
+    """
+    from app.depends import create_category
+    from app.models.product import ProductModel
+    from app.models.shop import Shops
+
+    async def create():
+        root = await create_category('Категория', -1)
+        child = await create_category('Подкатегория', root.id)
+        products = [await ProductModel.create(name=f'Товар {i}', description=f'Описание товара {i}',
+                                              item_number=f'A{i}', price=10 + i, count=100, img='',
+                                              category=child if i % 2 else root)
+                    for i in range(12)]
+        shop = await Shops.create(name='Магазин', location='Адрес')
+        return products, shop
+
+    return client.portal.call(create)
+
+
+@pytest.fixture
+def auth():
+    """
+    Получение cookie авторизации пользователя.
+    """
+
+    def cookies(user) -> dict:
+        return {'users_access_token': create_access_token({'sub': str(user.id)})}
+
+    return cookies
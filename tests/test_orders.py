@@ -0,0 +1,73 @@
+import re
+
+import pytest
+
+"""
+Количество запросов к базе данных при просмотре истории заказов
+"""
+
+
+def create_orders(client, buyer, products, shop, count: int, lines: int):
+    """
+    Создание заказов покупателя.
+    :param client: Приложение.
+    :param buyer: Покупатель.
+    :param products: Товары.
+    :param shop: Магазин.
+    :param count: Количество заказов.
+    :param lines: Количество товаров в заказе.
+    """
+    from app.depends import next_order_number
+    from app.models.buy import BuyerProd, OrderModel
+
+    async def create():
+        for _ in range(count):
+            number = await next_order_number()
+            order = await OrderModel.create(id=number, user=buyer, shop=shop,
+                                            total=sum(product.price for product in products[:lines]))
+            await BuyerProd.bulk_create([BuyerProd(user=buyer, product=product, shop=shop, id_operation=number,
+                                                   count=1, order=order) for product in products[:lines]])
+
+    client.portal.call(create)
+
+
+def count_queries(client, query_log, url: str, cookies: dict) -> tuple[int, str]:
+    """
+    Выполнение запроса страницы с подсчётом запросов к базе данных.
+    :return: Количество запросов SQL и текст страницы.
+    """
+    query_log.clear()
+    response = client.get(url, cookies=cookies)
+    assert response.status_code == 200
+    return len(query_log.queries), response.text
+
+
+@pytest.mark.parametrize('query', ['', '?cursor=1'])
+def test_order_history_query_count_does_not_depend_on_orders(client, users, catalog, query_log, auth, query):
+    _, buyer = users
+    products, shop = catalog
+    url = f'/buy/orders/{buyer.id}{query}'
+
+    create_orders(client, buyer, products, shop, count=1, lines=1)
+    single, page = count_queries(client, query_log, url, auth(buyer))
+    assert re.findall(r'Заказ номер: (\d+)', page) == ['1']
+
+    create_orders(client, buyer, products, shop, count=9, lines=5)
+    many, page = count_queries(client, query_log, url, auth(buyer))
+    assert re.findall(r'Заказ номер: (\d+)', page) == ['10', '9', '8', '7']
+
+    assert single == many
+
+
+def test_order_page_query_count_does_not_depend_on_lines(client, users, catalog, query_log, auth):
+    admin, buyer = users
+    products, shop = catalog
+    create_orders(client, buyer, products, shop, count=1, lines=1)
+    create_orders(client, buyer, products, shop, count=1, lines=10)
+
+    single, page = count_queries(client, query_log, '/buy/orders/number/1', auth(buyer))
+    assert 'Магазин: Магазин' in page
+    many, page = count_queries(client, query_log, '/buy/orders/number/2', auth(buyer))
+    assert page.count('Товар ') >= 10
+
+    assert single == many
@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from app.routers.product import PRODUCT_LIST_FIELDS
+
+"""
+Выбираемые колонки при выводе списков товаров и пользователей
+"""
+
+
+def selected_columns(query: str, table: str) -> set[str] | None:
+    """
+    Получение колонок, выбираемых запросом SELECT из таблицы (по псевдонимам колонок). Агрегирующие запросы не
+    учитываются.
+    :param query: Запрос SQL.
+    :param table: Имя таблицы.
+    :return: Выбираемые колонки или None, если запрос не выбирает строки таблицы.
+    """
+    match = re.match(rf'SELECT (.*?) FROM "{table}"[ :]', query)
+    if match is None or 'COUNT(' in match.group(1):
+        return None
+    return {re.findall(r'"(\w+)"', column)[-1] for column in match.group(1).split(',')}
+
+
+@pytest.mark.parametrize('query', ['', '?cursor=1', '?sort=price', '?q=Товар', '?category=1&in_stock=1'])
+def test_product_list_selects_only_list_fields(client, catalog, query_log, query):
+    query_log.clear()
+    response = client.get(f'/product/list{query}')
+    assert response.status_code == 200
+    assert 'Товар' in response.text
+
+    product_queries = [query for query in query_log.queries if re.search(r'FROM "products"[ :]', query)]
+    selects = [columns for columns in map(lambda query: selected_columns(query, 'products'), product_queries)
+               if columns is not None]
+    assert selects
+    assert all(columns == set(PRODUCT_LIST_FIELDS) for columns in selects)
+    assert not any('description' in query for query in product_queries)
+
+
+def test_user_list_selects_only_id_and_username(client, users, query_log, auth):
+    admin, _ = users
+    query_log.clear()
+    response = client.get('/user/list', cookies=auth(admin))
+    assert response.status_code == 200
+    assert 'buyer' in response.text
+
+    list_queries = [query for query in query_log.queries
+                    if query.startswith('SELECT') and 'FROM "users"' in query and 'WHERE' not in query]
+    assert len(list_queries) == 1
+    assert selected_columns(list_queries[0], 'users') == {'id', 'username'}
+    assert 'password' not in list_queries[0]